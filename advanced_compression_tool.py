@@ -1,39 +1,283 @@
-from collections import Counter
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, contextmanager
+from itertools import chain, islice, repeat
 import heapq
+import io
+import math
+import mmap
+import os
+import re
+import struct
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+
+
+# Default BWT block size, as in bzip2 -9
+BWT_BLOCK_SIZE = 900_000
+
+# Stands for the end of the data in create_rotations and the traced BWT
+# decode; it sorts before every byte value
+BWT_END = -1
+# Longest input whose BWT decode is traced round by round; the trace
+# holds n tables of n rows
+BWT_TRACE_LIMIT = 64
+
+# Bits resolved by one lookup in the primary Huffman decode table
+HUFFMAN_LOOKUP_BITS = 12
+# Bytes added to the decoder's bit accumulator per refill
+HUFFMAN_REFILL_BYTES = 32
+
+# Longest Huffman code HuffmanCompression emits by default (as in bzip2)
+MAX_CODE_LENGTH = 20
+# Longest code a Huffman header may hold; the vectorized encoder packs
+# codes into 64-bit words
+MAX_STORED_CODE_LENGTH = 64
+
+# Symbols per encoding step (bit-writer write or vectorized chunk), bytes per read when decoding
+HUFFMAN_CHUNK_SIZE = 1 << 16
+
+# Huffman header flag: several code tables chosen per group of symbols
+HEADER_MULTI_TABLE = 0x02
+# Huffman header flag: codes come from a HuffmanDictionary named by its id
+HEADER_DICTIONARY = 0x04
+
+# Symbols per selector and table refinement passes in multi-table mode (as in bzip2)
+HUFFMAN_GROUP_SIZE = 50
+HUFFMAN_TABLE_ITERATIONS = 4
+
+# Codebooks a CodebookCache keeps; width of the -log2(p) buckets a histogram
+# signature quantizes probabilities into, and the -log2(p) past which a
+# symbol is too rare to be part of it; extra bits per symbol a cached
+# codebook may cost over what it cost for the histogram it was built from
+CODEBOOK_CACHE_SIZE = 256
+CODEBOOK_SIGNATURE_BITS = 2
+CODEBOOK_SIGNATURE_MAX_BITS = 5
+CODEBOOK_COST_TOLERANCE = 0.1
+
+
+def encode_varint(value):
+    """Encodes a non-negative integer as an LEB128 varint."""
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varint(data, offset=0):
+    """Decodes an LEB128 varint, returning (value, offset after it)."""
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+# Stage instrumentation
+def _payload_size(value):
+    """Size in bytes of a stage input or output; tuples report their first item."""
+    if isinstance(value, tuple):
+        value = value[0]
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    try:
+        return len(value)
+    except TypeError:
+        return 0
+
+
+class StageStats:
+    """Accumulated measurements of one named stage."""
+
+    __slots__ = ('name', 'calls', 'wall_ns', 'cpu_ns', 'bytes_in', 'bytes_out', 'peak_bytes')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_ns = 0
+        self.cpu_ns = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.peak_bytes = None
+
+    @property
+    def wall_seconds(self):
+        return self.wall_ns / 1e9
+
+    @property
+    def cpu_seconds(self):
+        return self.cpu_ns / 1e9
+
+    @property
+    def throughput(self):
+        """Input bytes per second of wall time."""
+        return self.bytes_in / self.wall_seconds if self.wall_ns else 0.0
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'peak_bytes': self.peak_bytes,
+        }
+
+
+class StageProfile:
+    """Per-stage wall time, CPU time, bytes in/out and peak allocation.
+
+    run() calls a stage function and adds its measurements to the stage of
+    that name, so per-block stages accumulate over a whole run. With
+    `trace_memory`, each call also records the peak tracemalloc allocation
+    above what was allocated when it started.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name)
+
+        if self.trace_memory:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        wall = time.perf_counter_ns()
+        cpu = time.process_time_ns()
+        result = fn(*args, **kwargs)
+        stats.cpu_ns += time.process_time_ns() - cpu
+        stats.wall_ns += time.perf_counter_ns() - wall
+
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            if started:
+                tracemalloc.stop()
+            stats.peak_bytes = max(stats.peak_bytes or 0, peak)
+
+        stats.calls += 1
+        stats.bytes_in += _payload_size(args[0]) if args else 0
+        stats.bytes_out += _payload_size(result)
+        return result
+
+    @property
+    def wall_seconds(self):
+        return sum(stats.wall_ns for stats in self.stages.values()) / 1e9
+
+    def __iter__(self):
+        return iter(self.stages.values())
+
+    def __len__(self):
+        return len(self.stages)
+
+    def as_dicts(self):
+        return [stats.as_dict() for stats in self.stages.values()]
+
+
+def _run_stage(profile, name, fn, *args):
+    """Calls fn(*args), measured by `profile` when one is given."""
+    if profile is None:
+        return fn(*args)
+    return profile.run(name, fn, *args)
 
 
 # 1. Run-Length Encoding (RLE)
-def rle_encode(input_str):
-    """Encodes the input string using Run-Length Encoding."""
-    encoded = []
-    i = 0
-    while i < len(input_str):
-        count = 1
-        while i + 1 < len(input_str) and input_str[i] == input_str[i + 1]:
-            count += 1
-            i += 1
-        encoded.append(f"{input_str[i]}{count}")
-        i += 1
-    return ''.join(encoded)
-
-
-def rle_decode(encoded_str):
-    """Decodes an RLE-encoded string."""
-    decoded = []
-    i = 0
-    while i < len(encoded_str):
-        char = encoded_str[i]
-        i += 1
-        count = ""
-        while i < len(encoded_str) and encoded_str[i].isdigit():
-            count += encoded_str[i]
-            i += 1
-        decoded.append(char * int(count))
-    return ''.join(decoded)
+def _encode_varints(values):
+    """LEB128-encodes an array of non-negative integers in one pass."""
+    values = values.astype(np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        sizes += values >= (1 << shift)
+    starts = np.cumsum(sizes) - sizes
+    position = np.arange(int(sizes.sum())) - np.repeat(starts, sizes)
+    groups = np.repeat(values, sizes) >> (7 * position).astype(np.uint64)
+    more = position < np.repeat(sizes, sizes) - 1
+    return ((groups & 0x7F) | (more.astype(np.uint64) << 7)).astype(np.uint8).tobytes()
+
+
+def _decode_varints(buf, count):
+    """Decodes `count` LEB128 varints from a uint8 array.
+
+    Returns (values, number of bytes read).
+    """
+    if count == 0:
+        return np.zeros(0, dtype=np.uint64), 0
+    ends = np.flatnonzero(buf < 0x80)[:count]
+    if len(ends) < count:
+        raise ValueError("Truncated run lengths")
+    used = int(ends[-1]) + 1
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    position = np.arange(used) - np.repeat(starts, ends - starts + 1)
+    groups = (buf[:used] & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.add.reduceat(groups, starts), used
+
+
+def rle_encode(data):
+    """Run-length encodes bytes into an unambiguous binary format.
+
+    Layout: varint run count, one byte value per run, a bitmap marking the
+    runs longer than one byte, then a varint (length - 2) for each marked
+    run. Runs are found with NumPy, so no Python loop touches the data and
+    non-repeating input grows by at most one bit per byte.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if buf.size == 0:
+        return encode_varint(0)
+
+    starts = np.concatenate(([0], np.flatnonzero(buf[1:] != buf[:-1]) + 1))
+    lengths = np.diff(np.append(starts, buf.size))
+    repeated = lengths > 1
+
+    return b''.join((
+        encode_varint(len(starts)),
+        buf[starts].tobytes(),
+        np.packbits(repeated).tobytes(),
+        _encode_varints(lengths[repeated] - 2),
+    ))
+
+
+def rle_decode(encoded):
+    """Decodes the output of rle_encode back into bytes."""
+    buf = np.frombuffer(encoded, dtype=np.uint8)
+    runs, offset = decode_varint(buf[:10].tobytes())
+    bitmap_end = offset + runs + (runs + 7) // 8
+    if bitmap_end > buf.size:
+        raise ValueError("Truncated RLE data")
+
+    values = buf[offset:offset + runs]
+    repeated = np.unpackbits(buf[offset + runs:bitmap_end])[:runs].astype(bool)
+    extra, _ = _decode_varints(buf[bitmap_end:], int(repeated.sum()))
+
+    lengths = np.ones(runs, dtype=np.int64)
+    lengths[repeated] = extra.astype(np.int64) + 2
+    return np.repeat(values, lengths).tobytes()
 
 
 # 2. Huffman Coding
 class HuffmanNode:
+    """Pointer-based tree node, built from a HuffmanTree for drawing."""
+    __slots__ = ('char', 'freq', 'left', 'right')
+
     def __init__(self, char, freq):
         self.char = char
         self.freq = freq
@@ -44,112 +288,2373 @@ class HuffmanNode:
         return self.freq < other.freq
 
 
+class HuffmanTree:
+    """Huffman tree stored as parallel int arrays.
+
+    Nodes 0..n-1 are the leaves in increasing frequency order and nodes
+    n..2n-2 the internal nodes in the order they were merged, so every
+    parent comes after its children and the root is the last node. `left`
+    and `right` are -1 for leaves, `parent` is -1 for the root.
+
+    Construction is the two-queue method: once the leaves are sorted, the
+    merged nodes come out in nondecreasing weight, so the two lightest
+    nodes are always at the front of the leaf queue or the merged queue
+    and the tree is built in linear time.
+    """
+    __slots__ = ('symbols', 'weight', 'parent', 'left', 'right')
+
+    def __init__(self, freq_dict):
+        items = sorted(freq_dict.items(), key=lambda item: item[1])
+        if not items:
+            raise ValueError("Cannot build a Huffman tree without symbols")
+        leaves = len(items)
+        size = 2 * leaves - 1
+        self.symbols = [symbol for symbol, _ in items]
+        weight = [freq for _, freq in items] + [0] * (leaves - 1)
+        parent = [-1] * size
+        left = [-1] * size
+        right = [-1] * size
+
+        leaf = 0
+        merged = leaves
+        for node in range(leaves, size):
+            for side in (left, right):
+                # The merged queue is empty while its head is the node being built
+                if leaf < leaves and (merged == node or weight[leaf] <= weight[merged]):
+                    child = leaf
+                    leaf += 1
+                else:
+                    child = merged
+                    merged += 1
+                side[node] = child
+                parent[child] = node
+            weight[node] = weight[left[node]] + weight[right[node]]
+
+        self.weight = weight
+        self.parent = parent
+        self.left = left
+        self.right = right
+
+    def __len__(self):
+        return len(self.parent)
+
+    def depths(self):
+        """Depth of every node, filled from the root down."""
+        parent = self.parent
+        depth = [0] * len(parent)
+        for node in range(len(parent) - 2, -1, -1):
+            depth[node] = depth[parent[node]] + 1
+        return depth
+
+    def code_lengths(self):
+        """Returns {symbol: code length}; a lone symbol gets one bit."""
+        depth = self.depths()
+        return {symbol: depth[index] or 1 for index, symbol in enumerate(self.symbols)}
+
+    def codes(self):
+        """Returns {symbol: code} with 0 for each left branch and 1 for each right."""
+        leaves = len(self.symbols)
+        code = [0] * len(self.parent)
+        depth = [0] * len(self.parent)
+        for node in range(len(self.parent) - 1, leaves - 1, -1):
+            for bit, child in ((0, self.left[node]), (1, self.right[node])):
+                code[child] = code[node] << 1 | bit
+                depth[child] = depth[node] + 1
+        return {symbol: format(code[index], f'0{depth[index]}b') if depth[index] else "0"
+                for index, symbol in enumerate(self.symbols)}
+
+    def to_nodes(self):
+        """Returns the root of an equivalent HuffmanNode tree."""
+        nodes = [HuffmanNode(symbol, self.weight[index]) for index, symbol in enumerate(self.symbols)]
+        for node in range(len(self.symbols), len(self.parent)):
+            merged = HuffmanNode(None, self.weight[node])
+            merged.left = nodes[self.left[node]]
+            merged.right = nodes[self.right[node]]
+            nodes.append(merged)
+        return nodes[-1]
+
+
 def build_huffman_tree(freq_dict):
-    """Builds a Huffman tree from a frequency dictionary."""
-    heap = [HuffmanNode(char, freq) for char, freq in freq_dict.items()]
-    heapq.heapify(heap)
+    """Builds a Huffman tree from a frequency dictionary as HuffmanNode objects."""
+    return HuffmanTree(freq_dict).to_nodes()
 
-    while len(heap) > 1:
-        left = heapq.heappop(heap)
-        right = heapq.heappop(heap)
-        merged = HuffmanNode(None, left.freq + right.freq)
-        merged.left = left
-        merged.right = right
-        heapq.heappush(heap, merged)
 
-    return heap[0]
+def generate_huffman_codes(tree, canonical=False):
+    """Generates Huffman codes from a HuffmanTree or a HuffmanNode tree.
 
+    With `canonical`, only the code lengths are taken from the tree and the
+    codes are reassigned canonically (see canonical_codes).
+    """
+    if canonical:
+        return canonical_codes(huffman_code_lengths(tree))
+    if isinstance(tree, HuffmanTree):
+        return tree.codes()
 
-def generate_huffman_codes(tree):
-    """Generates Huffman codes from the Huffman tree."""
     codes = {}
+    stack = [(tree, "")]
+    while stack:
+        node, current_code = stack.pop()
+        if node.char is not None:
+            # A tree with a single leaf still needs a one-bit code
+            codes[node.char] = current_code or "0"
+            continue
+        if node.right is not None:
+            stack.append((node.right, current_code + "1"))
+        if node.left is not None:
+            stack.append((node.left, current_code + "0"))
+    return codes
 
-    def _generate_codes(node, current_code):
-        if node is None:
-            return
+
+def huffman_code_lengths(tree):
+    """Returns {symbol: code length} for the leaves of a Huffman tree."""
+    if isinstance(tree, HuffmanTree):
+        return tree.code_lengths()
+
+    lengths = {}
+    stack = [(tree, 0)]
+    while stack:
+        node, depth = stack.pop()
         if node.char is not None:
-            codes[node.char] = current_code
-        _generate_codes(node.left, current_code + "0")
-        _generate_codes(node.right, current_code + "1")
+            lengths[node.char] = depth or 1
+            continue
+        if node.left is not None:
+            stack.append((node.left, depth + 1))
+        if node.right is not None:
+            stack.append((node.right, depth + 1))
+    return lengths
+
+
+def limited_code_lengths(freq_dict, max_length=MAX_CODE_LENGTH):
+    """Optimal code lengths of at most `max_length` bits, by package-merge.
+
+    Each symbol starts as a coin of its frequency at every length. Coins
+    are paired into packages one level at a time and merged back with the
+    leaves; a symbol's code length is the number of times it appears in
+    the 2n - 2 cheapest items of the final list.
+    """
+    symbols = sorted(freq_dict, key=lambda symbol: freq_dict[symbol])
+    n = len(symbols)
+    if n == 1:
+        return {symbols[0]: 1}
+    if n > 1 << max_length:
+        raise ValueError(f"{n} symbols cannot be coded in {max_length} bits")
+
+    leaves = [(freq_dict[symbol], (index,)) for index, symbol in enumerate(symbols)]
+    items = leaves
+    for _ in range(max_length - 1):
+        packages = [(items[i][0] + items[i + 1][0], items[i][1] + items[i + 1][1])
+                    for i in range(0, len(items) - 1, 2)]
+        items = list(heapq.merge(leaves, packages, key=lambda item: item[0]))
+
+    counts = [0] * n
+    for _, members in items[:2 * n - 2]:
+        for index in members:
+            counts[index] += 1
+    return {symbol: counts[index] for index, symbol in enumerate(symbols)}
+
 
-    _generate_codes(tree, "")
+def canonical_codes(lengths):
+    """Assigns canonical Huffman codes from {symbol: code length}.
+
+    Symbols are ordered by (length, symbol) and given consecutive codes, so
+    the lengths alone are enough to rebuild the code table.
+    """
+    codes = {}
+    code = 0
+    previous_length = 0
+    for symbol, length in sorted(lengths.items(), key=lambda item: (item[1], item[0])):
+        code <<= length - previous_length
+        codes[symbol] = format(code, f'0{length}b')
+        code += 1
+        previous_length = length
     return codes
 
 
-def huffman_encode(input_str, codes):
-    """Encodes the input string using Huffman codes."""
-    return ''.join(codes[char] for char in input_str)
+def pack_code_lengths(lengths):
+    """Serializes {symbol: code length} into a compact header.
+
+    Layout: flags byte (0; HEADER_MULTI_TABLE and HEADER_DICTIONARY
+    payloads set it instead of starting with this header), maximum length
+    L, one varint count per length 1..L, then the symbols in canonical
+    order as varints, each one stored as the gap from the previous symbol
+    of the same length.
+    """
+    max_length = max(lengths.values(), default=0)
+    if max_length > MAX_STORED_CODE_LENGTH:
+        raise ValueError(f"Code lengths above {MAX_STORED_CODE_LENGTH} bits cannot be stored")
+    groups = [[] for _ in range(max_length + 1)]
+    for symbol in sorted(lengths):
+        groups[lengths[symbol]].append(symbol)
+
+    header = bytearray((0, max_length))
+    for group in groups[1:]:
+        header += encode_varint(len(group))
+    for group in groups[1:]:
+        previous = 0
+        for value in group:
+            header += encode_varint(value - previous)
+            previous = value
+    return bytes(header)
+
+
+def unpack_code_lengths(data, offset=0):
+    """Parses a pack_code_lengths header.
+
+    Returns (lengths, offset after the header).
+    """
+    if offset + 2 > len(data):
+        raise ValueError("Truncated Huffman header")
+    flags, max_length = data[offset], data[offset + 1]
+    if flags:
+        raise ValueError(f"Unsupported Huffman header flags {flags:#04x}")
+    if max_length > MAX_STORED_CODE_LENGTH:
+        raise ValueError(f"Invalid Huffman header: code lengths above {MAX_STORED_CODE_LENGTH} bits")
+    offset += 2
+
+    counts = []
+    for _ in range(max_length):
+        count, offset = decode_varint(data, offset)
+        counts.append(count)
+
+    lengths = {}
+    kraft = 0
+    for length, count in enumerate(counts, 1):
+        value = 0
+        for _ in range(count):
+            gap, offset = decode_varint(data, offset)
+            value += gap
+            lengths[value] = length
+        kraft += count << (max_length - length)
+    if kraft > 1 << max_length:
+        raise ValueError("Invalid Huffman header: code lengths oversubscribe the code space")
+
+    return lengths, offset
+
+
+class BitWriter:
+    """Packs variable-length codes MSB-first into bytes.
+
+    Bits collect in an integer accumulator that is flushed to the output in
+    whole 64-bit words; the final partial word is zero-padded to a byte.
+    """
+    __slots__ = ('_words', '_acc', '_nbits', 'bit_length')
+
+    WORD_BITS = 64
+
+    def __init__(self):
+        self._words = []
+        self._acc = 0
+        self._nbits = 0
+        self.bit_length = 0
+
+    def write(self, value, length):
+        """Appends the low `length` bits of `value`."""
+        self._acc = (self._acc << length) | value
+        self._nbits += length
+        self.bit_length += length
+        if self._nbits >= self.WORD_BITS:
+            spare = self._nbits % self.WORD_BITS
+            self._words.append((self._acc >> spare).to_bytes((self._nbits - spare) >> 3, 'big'))
+            self._acc &= (1 << spare) - 1
+            self._nbits = spare
+
+    def write_bits(self, bits):
+        """Appends a string of '0'/'1' characters."""
+        if bits:
+            self.write(int(bits, 2), len(bits))
+
+    def getvalue(self):
+        padding = -self._nbits % 8
+        tail = (self._acc << padding).to_bytes((self._nbits + padding) >> 3, 'big')
+        return b''.join(self._words) + tail
+
+
+class BitReader:
+    """Reads MSB-first bits back out of a packed buffer."""
+    __slots__ = ('_data', '_pos', 'bit_length')
+
+    def __init__(self, data, bit_length=None):
+        self._data = bytes(data)
+        self._pos = 0
+        self.bit_length = len(self._data) * 8 if bit_length is None else bit_length
+        if self.bit_length > len(self._data) * 8:
+            raise ValueError("bit_length exceeds the buffer size")
+
+    @property
+    def remaining(self):
+        return self.bit_length - self._pos
+
+    def read(self, n):
+        """Consumes `n` bits and returns them as an integer."""
+        if n > self.remaining:
+            raise ValueError("Not enough bits left in the buffer")
+        end = self._pos + n
+        first = self._pos >> 3
+        last = (end + 7) >> 3
+        value = int.from_bytes(self._data[first:last], 'big') >> ((last << 3) - end)
+        self._pos = end
+        return value & ((1 << n) - 1)
+
+    def read_bits(self, n):
+        """Consumes up to `n` bits and returns them as a '0'/'1' string."""
+        n = min(n, self.remaining)
+        return format(self.read(n), f'0{n}b') if n else ''
+
+
+def _encode_arrays(tables):
+    """Left-aligned 64-bit codes and code lengths of byte code tables, 256 entries per table."""
+    aligned = np.zeros(256 * len(tables), dtype=np.uint64)
+    lengths = np.zeros(256 * len(tables), dtype=np.uint8)
+    for t, table in enumerate(tables):
+        for symbol, code in table.items():
+            aligned[256 * t + symbol] = int(code, 2) << (64 - len(code))
+            lengths[256 * t + symbol] = len(code)
+    return aligned, lengths
+
+
+def _huffman_encode_bytes(data, codes, selectors=None, group_size=HUFFMAN_GROUP_SIZE, arrays=None):
+    """Vectorized huffman_encode for byte symbols.
+
+    Symbols index NumPy arrays of left-aligned 64-bit codes and code
+    lengths; a cumulative sum of the lengths gives each code's bit offset,
+    each code is shifted into its 64-bit output word, and the codes sharing
+    a word are OR-ed together with reduceat. Codes crossing a word boundary
+    add their tail to the next word. Input is processed HUFFMAN_CHUNK_SIZE
+    symbols at a time, so temporary arrays stay small.
+
+    With `selectors`, `codes` is a list of code tables and each group of
+    `group_size` symbols is coded with the table its selector names.
+    `arrays` are prebuilt _encode_arrays of the table(s).
+    """
+    aligned, lengths = arrays or _encode_arrays([codes] if selectors is None else codes)
+
+    symbols = np.frombuffer(data, dtype=np.uint8)
+    parts = []
+    bit_length = 0
+    for start in range(0, len(symbols), HUFFMAN_CHUNK_SIZE):
+        chunk = symbols[start:start + HUFFMAN_CHUNK_SIZE]
+        if selectors is not None:
+            groups = np.arange(start, start + len(chunk)) // group_size
+            chunk = selectors[groups] * 256 + chunk
+        code_lengths = lengths[chunk]
+        if not code_lengths.all():
+            raise KeyError(int(chunk[np.argmin(code_lengths)]) & 0xFF)
+        # Bits of the previous chunk's last word that are already used
+        used = bit_length & 63
+        ends = np.cumsum(code_lengths, dtype=np.int64) + used
+        starts = ends - code_lengths
+        word = starts >> 6
+        shift = starts & 63
+        chunk_codes = aligned[chunk]
+
+        words = np.zeros((int(ends[-1]) + 63) >> 6, dtype=np.uint64)
+        first = np.concatenate(([0], np.flatnonzero(word[1:] != word[:-1]) + 1))
+        words[word[first]] = np.bitwise_or.reduceat(chunk_codes >> shift.view(np.uint64), first)
+        crossing = np.flatnonzero(shift + code_lengths > 64)
+        words[word[crossing] + 1] |= chunk_codes[crossing] << (64 - shift[crossing]).view(np.uint64)
 
+        if used:
+            words[0] |= parts[-1][-1]
+            parts[-1] = parts[-1][:-1]
+        parts.append(words)
+        bit_length += int(ends[-1]) - used
 
-def huffman_decode(encoded_bits, code_table):
-    # Reverse the code table for decoding: {code: symbol}
-    reverse_table = {code: symbol for symbol, code in code_table.items()}
+    if not parts:
+        return b'', 0
+    packed = np.concatenate(parts).astype('>u8').tobytes()
+    return packed[:(bit_length + 7) >> 3], bit_length
 
+
+def huffman_encode(data, codes, arrays=None):
+    """Encodes bytes using Huffman codes.
+
+    Returns (payload, bit_length): the codes packed into bytes and the
+    number of meaningful bits, the rest of the last byte being padding.
+    Codes of up to 64 bits take the vectorized path, using `arrays` from
+    _encode_arrays when given; longer ones go through a BitWriter.
+    """
+    if arrays is not None or max(map(len, codes.values()), default=0) <= 64:
+        return _huffman_encode_bytes(data, codes, arrays=arrays)
+    writer = BitWriter()
+    lookup = codes.__getitem__
+    for start in range(0, len(data), HUFFMAN_CHUNK_SIZE):
+        writer.write_bits(''.join(map(lookup, data[start:start + HUFFMAN_CHUNK_SIZE])))
+    return writer.getvalue(), writer.bit_length
+
+
+def decode_window_bits(max_length, bit_length=None):
+    """Lookup window for codes of up to `max_length` bits.
+
+    Without a payload size the window covers the longest code, up to
+    HUFFMAN_LOOKUP_BITS, so small alphabets get small tables. For a
+    `bit_length`-bit payload it gets about one table entry per 256 payload
+    bits instead, up to HUFFMAN_LOOKUP_BITS: building the table then stays
+    cheap next to decoding, and codes longer than the window go through
+    subtables.
+    """
+    if bit_length is None:
+        return max(1, min(HUFFMAN_LOOKUP_BITS, max_length))
+    return max(1, min(HUFFMAN_LOOKUP_BITS, (bit_length >> 8).bit_length()))
+
+
+def build_decode_table(code_table, lookup_bits=None):
+    """Builds the lookup table used by huffman_decode.
+
+    Returns (table, lookup_bits); `lookup_bits` defaults to
+    decode_window_bits of the longest code. `table` is a list indexed by
+    the integer value of a `lookup_bits`-bit window and holds (symbols,
+    consumed): all the whole codes the window starts with, joined, and the
+    number of bits they use. Windows whose first code is longer than
+    `lookup_bits` hold ((subtable, width), 0), where `subtable` is indexed
+    by the following `width` bits, at most HUFFMAN_LOOKUP_BITS, and holds
+    (symbol, code length) or, for codes longer still, another
+    ((subtable, width), 0).
+    """
+    words = {symbol: (int(code, 2), len(code)) for symbol, code in code_table.items()}
+    if lookup_bits is None:
+        lookup_bits = decode_window_bits(max((length for _, length in words.values()), default=0))
+    empty = b''
+
+    # First whole code of each window, or None when it is a long code
+    first = [None] * (1 << lookup_bits)
+    long_codes = {}
+    for symbol, (value, length) in words.items():
+        run = bytes((symbol,))
+        if length <= lookup_bits:
+            shift = lookup_bits - length
+            start = value << shift
+            first[start:start + (1 << shift)] = [(run, length)] * (1 << shift)
+        else:
+            prefix = value >> (length - lookup_bits)
+            long_codes.setdefault(prefix, []).append((run, value, length))
+
+    # runs[width][v]: whole codes packed at the start of the width-bit window v
+    runs = [[(empty, 0)]]
+    for width in range(1, lookup_bits + 1):
+        row = []
+        for v in range(1 << width):
+            entry = first[v << (lookup_bits - width)]
+            if entry is None or entry[1] > width:
+                row.append((empty, 0))
+            else:
+                run, length = entry
+                rest = width - length
+                more, used = runs[rest][v & ((1 << rest) - 1)]
+                row.append((run + more, length + used))
+        runs.append(row)
+
+    table = runs[lookup_bits]
+    for prefix, entries in long_codes.items():
+        table[prefix] = (_build_subtable(entries, lookup_bits), 0)
+    return table, lookup_bits
+
+
+def _build_subtable(entries, skip):
+    """(subtable, width) for the (run, value, length) codes sharing their first `skip` bits."""
+    width = min(max(length for _, _, length in entries) - skip, HUFFMAN_LOOKUP_BITS)
+    subtable = [None] * (1 << width)
+    longer = {}
+    for run, value, length in entries:
+        rest = length - skip
+        if rest <= width:
+            shift = width - rest
+            start = (value & ((1 << rest) - 1)) << shift
+            subtable[start:start + (1 << shift)] = [(run, length)] * (1 << shift)
+        else:
+            longer.setdefault((value >> (rest - width)) & ((1 << width) - 1), []).append((run, value, length))
+    for prefix, codes in longer.items():
+        subtable[prefix] = (_build_subtable(codes, skip + width), 0)
+    return subtable, width
+
+
+# Bits of each byte value, most significant first
+_BYTE_BITS = [tuple((value >> shift) & 1 for shift in range(7, -1, -1)) for value in range(256)]
+
+
+def build_bitwise_codes(code_table):
+    """Builds the code map huffman_decode uses to decode bit by bit.
+
+    Returns (by_code, max_length): `by_code` maps each code's value with a
+    leading 1 bit to its symbol as one-byte bytes, so no strings are built
+    while decoding, and `max_length` is the longest code length.
+    """
+    by_code = {(1 << len(code)) | int(code, 2): bytes((symbol,)) for symbol, code in code_table.items()}
+    return by_code, max(map(len, code_table.values()), default=0)
+
+
+def _decode_bitwise(data, start, end, by_code):
+    """Decodes bits `start` to `end` of `data` one bit at a time.
+
+    Used where building a lookup table would cost more than it saves: short
+    payloads and the last bits after the table-driven loop. `by_code` is
+    the map from build_bitwise_codes. Returns the list of decoded symbols
+    as one-byte bytes.
+    """
+    first = start >> 3
+    bits = islice(chain.from_iterable(map(_BYTE_BITS.__getitem__, data[first:(end + 7) >> 3])),
+                  start - (first << 3), end - (first << 3))
+    decoded_output = []
+    code = 1
+    for bit in bits:
+        code = (code << 1) | bit
+        symbol = by_code.get(code)
+        if symbol is not None:
+            decoded_output.append(symbol)
+            code = 1
+    return decoded_output
+
+
+def _decode_windows(data, bit_length, table, lookup_bits, max_length, decoded_output):
+    """Table-driven decoding of whole windows; returns the position of the first undecoded bit.
+
+    Bits are kept in an integer accumulator refilled HUFFMAN_REFILL_BYTES
+    at a time, and each window is read from it by a shift and a mask.
+    Stops once fewer than `lookup_bits` bits are left.
+    """
+    # Bits a lookup may need: its window, or the whole of a long code
+    need = max(lookup_bits, max_length)
+    # Zero padding lets the accumulator and long codes read past the last byte
+    data = bytes(data) + bytes((need >> 3) + HUFFMAN_REFILL_BYTES)
+    refill = HUFFMAN_REFILL_BYTES * 8
+    mask = (1 << lookup_bits) - 1
+    acc = nbits = index = 0
+    # The next window lies within the payload while nbits >= floor
+    floor = lookup_bits - bit_length
+    append = decoded_output.append
+    while nbits >= floor:
+        while nbits < need:
+            acc = ((acc & ((1 << nbits) - 1)) << refill) | \
+                int.from_bytes(data[index:index + HUFFMAN_REFILL_BYTES], 'big')
+            index += HUFFMAN_REFILL_BYTES
+            nbits += refill
+            floor += refill
+        symbols, consumed = table[(acc >> (nbits - lookup_bits)) & mask]
+        if not consumed:
+            shift = nbits - lookup_bits
+            while not consumed:
+                subtable, width = symbols
+                shift -= width
+                symbols, consumed = subtable[(acc >> shift) & ((1 << width) - 1)]
+        append(symbols)
+        nbits -= consumed
+    return (index << 3) - nbits
+
+
+def huffman_decode(payload, code_table, bit_length=None, decode_table=None, bitwise_codes=None):
+    """Decodes a packed Huffman payload, resolving a whole lookup window per step.
+
+    `bit_length` is the number of meaningful bits returned by
+    huffman_encode; by default every bit of `payload` is decoded.
+    `decode_table` and `bitwise_codes` are prebuilt build_decode_table and
+    build_bitwise_codes results for `code_table`. Without a decode table,
+    one is sized to the payload by decode_window_bits, and payloads
+    shorter than a full 2**HUFFMAN_LOOKUP_BITS table, which decode faster
+    bit by bit than a table builds, skip it.
+    """
+    data = bytes(payload)
+    if bit_length is None:
+        bit_length = len(data) * 8
+    elif bit_length > len(data) * 8:
+        raise ValueError("bit_length exceeds the buffer size")
+    by_code, max_length = bitwise_codes or build_bitwise_codes(code_table)
+    if decode_table is None:
+        if bit_length < 1 << HUFFMAN_LOOKUP_BITS:
+            return b''.join(_decode_bitwise(data, 0, bit_length, by_code))
+        decode_table = build_decode_table(code_table, decode_window_bits(max_length, bit_length))
+
+    table, lookup_bits = decode_table
     decoded_output = []
-    buffer = ""
+    try:
+        pos = _decode_windows(data, bit_length, table, lookup_bits, max_length, decoded_output)
+    except (TypeError, ValueError):
+        raise ValueError("Corrupted Huffman payload") from None
+    # Fewer than lookup_bits bits remain: finish one code at a time
+    decoded_output += _decode_bitwise(data, pos, bit_length, by_code)
+    return b''.join(decoded_output)
+
+
+def code_lengths_for(freq_dict, max_code_length=MAX_CODE_LENGTH):
+    """Huffman code lengths for `freq_dict`, package-merge limited when needed."""
+    lengths = HuffmanTree(freq_dict).code_lengths()
+    if max_code_length and max(lengths.values()) > max_code_length:
+        lengths = limited_code_lengths(freq_dict, max_code_length)
+    return lengths
+
+
+def choose_huffman_tables(data, tables, group_size=HUFFMAN_GROUP_SIZE,
+                          iterations=HUFFMAN_TABLE_ITERATIONS, max_code_length=MAX_CODE_LENGTH):
+    """Builds up to `tables` code tables for groups of `group_size` bytes.
+
+    Groups are first ranked by their mean symbol value and split into
+    `tables` equal slices, one table built from each. As in bzip2, each
+    iteration then assigns every group the table that codes it in the
+    fewest bits and rebuilds each table from the groups assigned to it.
+    Every table covers the whole alphabet. Returns (list of
+    {symbol: length}, selector array, coded bits).
+    """
+    symbols = np.frombuffer(data, dtype=np.uint8)
+    alphabet = np.flatnonzero(np.bincount(symbols, minlength=256))
+    dense = np.zeros(256, dtype=np.int64)
+    dense[alphabet] = np.arange(len(alphabet))
+    group_count = -(-len(symbols) // group_size)
+    tables = max(1, min(tables, group_count))
+
+    # Per-group histograms over the alphabet actually present
+    groups = np.arange(len(symbols)) // group_size
+    hist = np.bincount(groups * len(alphabet) + dense[symbols],
+                       minlength=group_count * len(alphabet)).reshape(group_count, len(alphabet))
+
+    lengths, costs = _cluster_code_tables(hist, alphabet, tables, iterations, max_code_length)
+    table_lengths = [dict(zip(alphabet.tolist(), row.tolist())) for row in lengths]
+    return table_lengths, costs.argmin(axis=1), int(costs.min(axis=1).sum())
+
+
+def _cluster_code_tables(hist, alphabet, tables, iterations, max_code_length):
+    """Fits `tables` code tables to the rows of a histogram matrix.
+
+    Rows are seeded by mean symbol rank, then refined by reassigning each
+    row to its cheapest table and rebuilding the tables (see
+    choose_huffman_tables). Returns (code length matrix, row x table costs).
+    """
+    count = len(hist)
+
+    def rebuild(selectors):
+        rebuilt = []
+        for t in range(tables):
+            freq = hist[selectors == t].sum(axis=0) + 1
+            table = code_lengths_for(dict(zip(alphabet.tolist(), freq.tolist())), max_code_length)
+            rebuilt.append([table[symbol] for symbol in alphabet.tolist()])
+        return np.array(rebuilt, dtype=np.int64)
+
+    # Seed: low mean rank (well predicted stretches) to high mean rank
+    level = (hist @ np.arange(len(alphabet))) / np.maximum(hist.sum(axis=1), 1)
+    selectors = np.empty(count, dtype=np.int64)
+    selectors[np.argsort(level, kind='stable')] = np.arange(count) * tables // count
+    lengths = rebuild(selectors)
+
+    for _ in range(iterations):
+        selectors = (hist @ lengths.T).argmin(axis=1)
+        lengths = rebuild(selectors)
+    return lengths, hist @ lengths.T
+
+
+def _pack_selectors(selectors, tables):
+    """Codes selectors as in bzip2: move-to-front, then each rank in unary."""
+    order = list(range(tables))
+    ranks = []
+    for selector in selectors.tolist():
+        rank = order.index(selector)
+        ranks.append('1' * rank + '0')
+        del order[rank]
+        order.insert(0, selector)
+    writer = BitWriter()
+    writer.write_bits(''.join(ranks))
+    return writer.getvalue()
+
+
+def _unpack_selectors(data, offset, count, tables):
+    """Reads `count` selectors written by _pack_selectors at `offset`.
+
+    Returns (selector array, offset after them).
+    """
+    order = list(range(tables))
+    selectors = np.empty(count, dtype=np.int64)
+    bits = BitReader(data[offset:]).read_bits(count * tables)
+    pos = 0
+    for i in range(count):
+        end = bits.find('0', pos)
+        if end < 0 or end - pos >= tables:
+            raise ValueError("Invalid Huffman selectors")
+        selector = order.pop(end - pos)
+        order.insert(0, selector)
+        selectors[i] = selector
+        pos = end + 1
+    return selectors, offset + ((pos + 7) >> 3)
+
+
+def _decode_groups(payload, bit_length, table_codes, selectors, group_size, count):
+    """Table-driven decoding that switches code table every `group_size` symbols.
+
+    Each lookup still yields every whole code in its window; a run that
+    crosses the end of a group is cut there and the bits of the kept
+    symbols are added up from the table's code lengths. The zero padding
+    after the payload only ever decodes into symbols past `count`, which
+    are cut the same way. Each table's window is sized to its share of the
+    groups, and tables no group selects are not built.
+    """
+    code_lengths = [{symbol: len(code) for symbol, code in codes.items()} for codes in table_codes]
+    max_length = max(len(code) for codes in table_codes for code in codes.values())
+    decode_tables = []
+    for codes, share in zip(table_codes, np.bincount(selectors, minlength=len(table_codes)).tolist()):
+        lookup_bits = decode_window_bits(max_length, bit_length * share // len(selectors))
+        decode_tables.append(build_decode_table(codes, lookup_bits) if share else None)
+    need = max([max_length] + [table[1] for table in decode_tables if table])
+    data = bytes(payload) + bytes((need >> 3) + HUFFMAN_REFILL_BYTES)
+    refill = HUFFMAN_REFILL_BYTES * 8
+
+    decoded_output = []
+    append = decoded_output.append
+    acc = nbits = index = 0
+    try:
+        for group, t in enumerate(selectors.tolist()):
+            table, lookup_bits = decode_tables[t]
+            mask = (1 << lookup_bits) - 1
+            remaining = min(group_size, count - group * group_size)
+            while remaining > 0:
+                while nbits < need:
+                    acc = ((acc & ((1 << nbits) - 1)) << refill) | \
+                        int.from_bytes(data[index:index + HUFFMAN_REFILL_BYTES], 'big')
+                    index += HUFFMAN_REFILL_BYTES
+                    nbits += refill
+                symbols, consumed = table[(acc >> (nbits - lookup_bits)) & mask]
+                if not consumed:
+                    shift = nbits - lookup_bits
+                    while not consumed:
+                        subtable, width = symbols
+                        shift -= width
+                        symbols, consumed = subtable[(acc >> shift) & ((1 << width) - 1)]
+                remaining -= len(symbols)
+                if remaining < 0:
+                    symbols = symbols[:remaining]
+                    consumed = sum(code_lengths[t][symbol] for symbol in symbols)
+                append(symbols)
+                nbits -= consumed
+    except (TypeError, ValueError):
+        raise ValueError("Corrupted multi-table Huffman payload") from None
+    if (index << 3) - nbits != bit_length:
+        raise ValueError("Corrupted multi-table Huffman payload")
+    return b''.join(decoded_output)
+
+
+def byte_histogram(data):
+    """{byte value: count} of the values present in `data`, counted with a NumPy bincount."""
+    counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+    symbols = np.flatnonzero(counts)
+    return dict(zip(symbols.tolist(), counts[symbols].tolist()))
 
-    for bit in encoded_bits:
-        buffer += bit
-        if buffer in reverse_table:
-            decoded_output.append(reverse_table[buffer])
-            buffer = ""  # Reset buffer
 
-    return ''.join(decoded_output)
+def histogram_signature(freq_dict, bucket_bits=CODEBOOK_SIGNATURE_BITS,
+                        max_bits=CODEBOOK_SIGNATURE_MAX_BITS):
+    """Quantized shape of a histogram: sorted (symbol, -log2 p bucket) pairs.
+
+    Only symbols of probability at least 2**-max_bits take part, so
+    histograms whose common symbols have roughly the same probabilities
+    share a signature, whatever their total count and rare symbols. A
+    symbol's bucket, round(-log2 p / bucket_bits), is found by comparing
+    its count with the counts at the bucket boundaries, without logarithms.
+    """
+    total = sum(freq_dict.values())
+    floor = total / 2 ** max_bits
+    # Counts at which -log2 p reaches the lower edge of each bucket after the first, ascending
+    edges = int(max_bits / bucket_bits + 0.5)
+    bounds = [total / 2 ** (bucket_bits * (j - 0.5)) for j in range(edges, 0, -1)]
+    return tuple(sorted((symbol, edges - bisect_left(bounds, count))
+                        for symbol, count in freq_dict.items() if count >= floor))
+
+
+def code_redundancy(freq_dict, lengths):
+    """Bits per symbol that `lengths` spend on `freq_dict` over its entropy."""
+    total = sum(freq_dict.values())
+    bits = sum(count * lengths[symbol] for symbol, count in freq_dict.items())
+    entropy = sum(count * math.log2(total / count) for count in freq_dict.values())
+    return (bits - entropy) / total
+
+
+class Codebook:
+    """One canonical Huffman code: lengths, codes and packed header.
+
+    The vectorized encoder arrays, the decode table and the bitwise code
+    map are built on first use and kept, which is what makes caching a
+    codebook worthwhile. `histogram` is the {symbol: count} an encoder
+    built the code from, `hits` counts the times a CodebookCache returned
+    it again and `decoded_bits` adds up the payloads passed to
+    decode_table_for.
+    """
+
+    __slots__ = ('lengths', 'codes', 'header', 'redundancy', 'histogram', 'hits', 'decoded_bits',
+                 '_encode_arrays', '_decode_table', '_bitwise_codes')
+
+    def __init__(self, lengths, header=None, redundancy=0.0, histogram=None):
+        self.lengths = lengths
+        self.codes = canonical_codes(lengths)
+        self.header = header if header is not None else pack_code_lengths(lengths)
+        self.redundancy = redundancy
+        self.histogram = histogram
+        self.hits = 0
+        self.decoded_bits = 0
+        self._encode_arrays = None
+        self._decode_table = None
+        self._bitwise_codes = None
+
+    @property
+    def encode_arrays(self):
+        """_encode_arrays of the codes, or None when they cannot take the vectorized path."""
+        if self._encode_arrays is None and max(self.lengths.values(), default=0) <= 64:
+            self._encode_arrays = _encode_arrays([self.codes])
+        return self._encode_arrays
+
+    @property
+    def decode_table(self):
+        if self._decode_table is None:
+            self._decode_table = build_decode_table(self.codes)
+        return self._decode_table
+
+    @property
+    def bitwise_codes(self):
+        if self._bitwise_codes is None:
+            self._bitwise_codes = build_bitwise_codes(self.codes)
+        return self._bitwise_codes
+
+    def decode_table_for(self, bit_length):
+        """A decode table for a `bit_length`-bit payload, or None to decode it bit by bit.
+
+        The table is sized by decode_window_bits to all the bits decoded
+        with this codebook so far and rebuilt wider as they grow, so its
+        build cost keeps in step with its use. Short payloads of a codebook
+        that has not been reused are decoded bit by bit, as huffman_decode
+        does, so one-off codes never build a table.
+        """
+        self.decoded_bits += bit_length
+        if not self.hits and self.decoded_bits < 1 << HUFFMAN_LOOKUP_BITS:
+            return self._decode_table
+        lookup_bits = decode_window_bits(self.bitwise_codes[1], self.decoded_bits)
+        if self._decode_table is None or self._decode_table[1] < lookup_bits:
+            self._decode_table = build_decode_table(self.codes, lookup_bits)
+        return self._decode_table
+
+
+class CodebookCache:
+    """LRU cache of Codebooks shared by HuffmanCompression instances.
+
+    Encoders look codebooks up by the histogram_signature of their input
+    and their maximum code length. A cached codebook is used
+    as is for the histogram it was built from, and otherwise when it has a
+    code for every input symbol and costs at most `tolerance` bits per
+    symbol more, over the input's entropy, than it did for the histogram it
+    was built from; otherwise it is replaced (counted in `misses`, and in
+    `rejected` when only the cost check failed). Decoders look codebooks
+    up by the payload's code-length header, so repeated headers reuse the
+    decode table. At most `maxsize` codebooks are kept; the least recently
+    used one is evicted first.
+    """
+
+    def __init__(self, maxsize=CODEBOOK_CACHE_SIZE, tolerance=CODEBOOK_COST_TOLERANCE):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key):
+        codebook = self._entries.get(key)
+        if codebook is not None:
+            self._entries.move_to_end(key)
+        return codebook
+
+    def _put(self, key, codebook):
+        self._entries[key] = codebook
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def encoder(self, freq_dict, max_code_length=MAX_CODE_LENGTH):
+        """Returns a Codebook for `freq_dict`, cached or newly built."""
+        key = (max_code_length, histogram_signature(freq_dict))
+        cached = self._get(key)
+        if cached is not None:
+            # The histogram a codebook was built from needs no cost check
+            if freq_dict == cached.histogram:
+                cached.hits += 1
+                self.hits += 1
+                return cached
+            if freq_dict.keys() <= cached.lengths.keys():
+                if cached.redundancy is None:
+                    cached.redundancy = code_redundancy(cached.histogram, cached.lengths)
+                if code_redundancy(freq_dict, cached.lengths) <= cached.redundancy + self.tolerance:
+                    cached.hits += 1
+                    self.hits += 1
+                    return cached
+                self.rejected += 1
+        self.misses += 1
+        # Its own redundancy is only worked out once another histogram is compared with it
+        codebook = Codebook(code_lengths_for(freq_dict, max_code_length), redundancy=None,
+                            histogram=freq_dict)
+        self._put(key, codebook)
+        return codebook
+
+    def decoder(self, header, lengths):
+        """Returns the Codebook for a pack_code_lengths `header` that unpacks to `lengths`."""
+        header = bytes(header)
+        codebook = self._get(header)
+        if codebook is not None:
+            codebook.hits += 1
+            self.hits += 1
+            return codebook
+        self.misses += 1
+        codebook = Codebook(lengths, header=header)
+        self._put(header, codebook)
+        return codebook
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = self.rejected = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'rejected': self.rejected,
+                'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+# Static dictionaries: file magic, format version and customary extension
+DICTIONARY_MAGIC = b'BWHD'
+DICTIONARY_VERSION = 1
+DICTIONARY_EXTENSION = '.bwd'
+
+_DICTIONARY_HEADER = struct.Struct('>4sBIBB')
+
+
+class HuffmanDictionary:
+    """Static Huffman tables trained on sample records, as in zstd dictionaries.
+
+    Both sides load the same dictionary; a payload coded with it carries
+    the dictionary id and, when there are several tables, the index of the
+    table used, instead of a code-length header. Every table codes all 256
+    byte values. `mtf_alphabet`, when trained, is the initial move-to-front
+    order for MTFStage.
+
+    File layout: magic, version, dictionary id, flags (1: MTF alphabet
+    present), table count, one pack_code_lengths header per table, the
+    256-byte MTF alphabet if present, and a CRC32 of everything before it.
+    """
+
+    def __init__(self, tables, dict_id=None, mtf_alphabet=None):
+        if not 1 <= len(tables) <= 255:
+            raise ValueError("A dictionary holds between 1 and 255 tables")
+        if mtf_alphabet is not None and sorted(mtf_alphabet) != list(range(256)):
+            raise ValueError("The MTF alphabet must be a permutation of the 256 byte values")
+        self.codebooks = [Codebook(lengths) for lengths in tables]
+        self.mtf_alphabet = bytes(mtf_alphabet) if mtf_alphabet is not None else None
+        if dict_id is None:
+            dict_id = zlib.crc32(self._body()) & 0x7FFFFFFF
+        if not 0 <= dict_id < 1 << 32:
+            raise ValueError("Dictionary ids are 32-bit unsigned integers")
+        self.dict_id = dict_id
+
+    @classmethod
+    def train(cls, samples, tables=1, stages=('huffman',), mtf=False,
+              max_code_length=MAX_CODE_LENGTH, iterations=HUFFMAN_TABLE_ITERATIONS, dict_id=None):
+        """Trains a dictionary for records coded by `stages`.
+
+        Samples are run through the stages before the final 'huffman' one,
+        training the MTF alphabet (bytes by decreasing frequency) on the
+        input of the 'mtf' stage when `mtf` is set. Up to `tables` tables
+        are then fitted to the per-sample histograms of the Huffman input.
+        """
+        if not stages or stages[-1] != 'huffman':
+            raise ValueError("Dictionary stages must end with 'huffman'")
+        samples = [bytes(sample) for sample in samples if len(sample)]
+        if not samples:
+            raise ValueError("No samples to train on")
+
+        mtf_alphabet = None
+        for name in stages[:-1]:
+            if name not in PIPELINE_STAGES:
+                raise ValueError(f"Unknown pipeline stage {name!r}")
+            options = {}
+            if name == 'mtf' and mtf:
+                counts = np.bincount(np.frombuffer(b''.join(samples), dtype=np.uint8), minlength=256)
+                mtf_alphabet = np.argsort(-counts, kind='stable').astype(np.uint8).tobytes()
+                options['alphabet'] = mtf_alphabet
+            stage = PIPELINE_STAGES[name](**options)
+            samples = [stage.encode(sample) for sample in samples]
+
+        hist = np.stack([np.bincount(np.frombuffer(sample, dtype=np.uint8), minlength=256)
+                         for sample in samples if sample])
+        tables = max(1, min(tables, len(hist)))
+        lengths, costs = _cluster_code_tables(hist, np.arange(256), tables, iterations,
+                                              max_code_length)
+        used = np.unique(costs.argmin(axis=1))
+        table_lengths = [dict(enumerate(lengths[t].tolist())) for t in used.tolist()]
+        return cls(table_lengths, dict_id, mtf_alphabet)
+
+    def __len__(self):
+        return len(self.codebooks)
+
+    def select(self, freq_dict):
+        """Index of the table coding `freq_dict` in the fewest bits."""
+        best, best_bits = None, None
+        for index, codebook in enumerate(self.codebooks):
+            lengths = codebook.lengths
+            if not freq_dict.keys() <= lengths.keys():
+                continue
+            bits = sum(count * lengths[symbol] for symbol, count in freq_dict.items())
+            if best is None or bits < best_bits:
+                best, best_bits = index, bits
+        if best is None:
+            raise ValueError(f"Dictionary {self.dict_id:#x} has no table for this input")
+        return best
+
+    def payload_header(self, index):
+        """Header of a payload coded with table `index`."""
+        header = bytes((HEADER_DICTIONARY,)) + encode_varint(self.dict_id)
+        return header + encode_varint(index) if len(self.codebooks) > 1 else header
+
+    def _body(self):
+        return b''.join(pack_code_lengths(codebook.lengths) for codebook in self.codebooks) + \
+            (self.mtf_alphabet or b'')
+
+    def to_bytes(self):
+        header = _DICTIONARY_HEADER.pack(DICTIONARY_MAGIC, DICTIONARY_VERSION, self.dict_id,
+                                         1 if self.mtf_alphabet else 0, len(self.codebooks))
+        data = header + self._body()
+        return data + struct.pack('>I', zlib.crc32(data))
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < _DICTIONARY_HEADER.size + 4:
+            raise ValueError("Truncated Huffman dictionary")
+        magic, version, dict_id, flags, count = _DICTIONARY_HEADER.unpack_from(data)
+        if magic != DICTIONARY_MAGIC:
+            raise ValueError("Not a Huffman dictionary")
+        if version != DICTIONARY_VERSION:
+            raise ValueError(f"Unsupported dictionary version {version}")
+        (crc,) = struct.unpack_from('>I', data, len(data) - 4)
+        if zlib.crc32(data[:-4]) != crc:
+            raise ValueError("Huffman dictionary CRC mismatch")
+
+        offset = _DICTIONARY_HEADER.size
+        tables = []
+        for _ in range(count):
+            lengths, offset = unpack_code_lengths(data, offset)
+            tables.append(lengths)
+        mtf_alphabet = None
+        if flags & 1:
+            mtf_alphabet = data[offset:offset + 256]
+            offset += 256
+        if offset != len(data) - 4:
+            raise ValueError("Invalid Huffman dictionary layout")
+        return cls(tables, dict_id, mtf_alphabet)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
 
 
 class HuffmanCompression:
-    def __init__(self):
-        self.huffman_tree = None
+    """Canonical Huffman coder producing self-describing payloads.
+
+    Codes are limited to `max_code_length` bits (None for no limit) so the
+    decode tables stay small. A payload is the pack_code_lengths header,
+    the number of coded bits as a varint, then the packed bitstream; decode
+    needs nothing else.
+
+    With `tables` > 1, byte inputs may be coded with several tables, one
+    chosen per group of HUFFMAN_GROUP_SIZE symbols (see
+    choose_huffman_tables); that layout is used only when it is smaller.
+    Its payload is the HEADER_MULTI_TABLE flags byte, the table count, the
+    symbol count as a varint, the packed selectors, one pack_code_lengths
+    header per table, the number of coded bits as a varint and the bitstream.
+
+    With a CodebookCache, single-table codes are taken from and added to
+    the cache instead of being rebuilt for every call; `tree` is then None.
+
+    With a HuffmanDictionary, byte inputs are coded with its cheapest table
+    and the payload is the HEADER_DICTIONARY flags byte, the dictionary id
+    as a varint, the table index as a varint (only when the dictionary has
+    several tables), the number of coded bits as a varint and the bitstream.
+    """
+
+    def __init__(self, max_code_length=MAX_CODE_LENGTH, tables=1, cache=None, dictionary=None):
+        if not 1 <= tables <= 255:
+            raise ValueError("tables must be between 1 and 255")
+        self.max_code_length = max_code_length
+        self.tables = tables
+        self.cache = cache
+        self.dictionary = dictionary
+        self.tree = None
         self.huffman_codes = None
+        self.table_codes = None
+        self.selectors = None
+        self.bit_length = 0
+
+    @property
+    def huffman_tree(self):
+        """HuffmanNode view of the last encoded tree, for drawing."""
+        return self.tree.to_nodes() if self.tree is not None else None
+
+    def _encode_multi_table(self, data, freq_dict, single_lengths, single_header):
+        """Returns the multi-table payload, or None when one table is smaller.
+
+        `freq_dict` is the byte histogram of `data`, which prices the single
+        table without another pass over the block.
+        """
+        table_lengths, selectors, bit_length = choose_huffman_tables(
+            data, self.tables, max_code_length=self.max_code_length)
+        if len(table_lengths) < 2:
+            return None
+        header = b''.join((
+            bytes((HEADER_MULTI_TABLE, len(table_lengths))),
+            encode_varint(len(data)),
+            _pack_selectors(selectors, len(table_lengths)),
+            *(pack_code_lengths(lengths) for lengths in table_lengths),
+        ))
+        single_bits = sum(single_lengths[symbol] * count for symbol, count in freq_dict.items())
+        if len(header) * 8 + bit_length >= len(single_header) * 8 + single_bits:
+            return None
 
-    def encode(self, text):
-        freq_dict = Counter(text)
+        self.table_codes = [canonical_codes(lengths) for lengths in table_lengths]
+        self.selectors = selectors
+        encoded, self.bit_length = _huffman_encode_bytes(data, self.table_codes, selectors)
+        return header + encode_varint(self.bit_length) + encoded
 
-        self.huffman_tree = build_huffman_tree(freq_dict)
+    def encode(self, data):
+        if isinstance(data, str):
+            raise TypeError("Huffman coding works on bytes; encode text first")
+        self.table_codes = None
+        self.selectors = None
+        if not len(data):
+            self.tree = None
+            self.huffman_codes = {}
+            self.bit_length = 0
+            return pack_code_lengths({}) + encode_varint(0)
 
-        self.huffman_codes = generate_huffman_codes(self.huffman_tree)
+        freq_dict = byte_histogram(data)
+        if self.dictionary is not None:
+            return self._encode_with_dictionary(data, freq_dict)
+        if self.cache is not None:
+            self.tree = None
+            codebook = self.cache.encoder(freq_dict, self.max_code_length)
+        else:
+            self.tree = HuffmanTree(freq_dict)
+            lengths = self.tree.code_lengths()
+            if self.max_code_length and max(lengths.values()) > self.max_code_length:
+                lengths = limited_code_lengths(freq_dict, self.max_code_length)
+            codebook = Codebook(lengths)
+        self.huffman_codes = codebook.codes
 
-        encoded = huffman_encode(text, self.huffman_codes)
+        if self.tables > 1:
+            encoded = self._encode_multi_table(data, freq_dict, codebook.lengths, codebook.header)
+            if encoded is not None:
+                return encoded
 
-        return encoded
+        encoded, self.bit_length = huffman_encode(data, self.huffman_codes, codebook.encode_arrays)
+
+        return codebook.header + encode_varint(self.bit_length) + encoded
+
+    def _encode_with_dictionary(self, data, freq_dict):
+        index = self.dictionary.select(freq_dict)
+        codebook = self.dictionary.codebooks[index]
+        self.tree = None
+        self.huffman_codes = codebook.codes
+        encoded, self.bit_length = huffman_encode(data, codebook.codes, codebook.encode_arrays)
+        return self.dictionary.payload_header(index) + encode_varint(self.bit_length) + encoded
+
+    def _decode_with_dictionary(self, encoded):
+        dict_id, offset = decode_varint(encoded, 1)
+        if self.dictionary is None or self.dictionary.dict_id != dict_id:
+            raise ValueError(f"Huffman payload needs dictionary {dict_id:#x}")
+        index = 0
+        if len(self.dictionary) > 1:
+            index, offset = decode_varint(encoded, offset)
+            if index >= len(self.dictionary):
+                raise ValueError("Invalid dictionary table index")
+        self.bit_length, offset = decode_varint(encoded, offset)
+        codebook = self.dictionary.codebooks[index]
+        self.tree = None
+        self.huffman_codes = codebook.codes
+        if not self.bit_length:
+            return b''
+        return huffman_decode(memoryview(encoded)[offset:], codebook.codes, self.bit_length,
+                              codebook.decode_table, codebook.bitwise_codes)
+
+    def _decode_multi_table(self, encoded):
+        if len(encoded) < 2:
+            raise ValueError("Truncated Huffman header")
+        tables = encoded[1]
+        count, offset = decode_varint(encoded, 2)
+        group_count = -(-count // HUFFMAN_GROUP_SIZE)
+        self.selectors, offset = _unpack_selectors(encoded, offset, group_count, tables)
+        self.table_codes = []
+        for _ in range(tables):
+            lengths, offset = unpack_code_lengths(encoded, offset)
+            self.table_codes.append(canonical_codes(lengths))
+        self.bit_length, offset = decode_varint(encoded, offset)
+        self.tree = None
+        self.huffman_codes = self.table_codes[0]
+        return _decode_groups(memoryview(encoded)[offset:], self.bit_length, self.table_codes,
+                              self.selectors, HUFFMAN_GROUP_SIZE, count)
 
     def decode(self, encoded):
-        decoded = huffman_decode(encoded, self.huffman_tree)
+        self.table_codes = None
+        self.selectors = None
+        if encoded and encoded[0] & HEADER_DICTIONARY:
+            return self._decode_with_dictionary(encoded)
+        if encoded and encoded[0] & HEADER_MULTI_TABLE:
+            return self._decode_multi_table(encoded)
+        lengths, header_end = unpack_code_lengths(encoded)
+        self.bit_length, offset = decode_varint(encoded, header_end)
+        self.tree = None
+        if not self.bit_length:
+            self.huffman_codes = canonical_codes(lengths)
+            return b''
+
+        decode_table = bitwise_codes = None
+        if self.cache is not None:
+            codebook = self.cache.decoder(encoded[:header_end], lengths)
+            self.huffman_codes = codebook.codes
+            decode_table = codebook.decode_table_for(self.bit_length)
+            bitwise_codes = codebook.bitwise_codes
+        else:
+            self.huffman_codes = canonical_codes(lengths)
+        decoded = huffman_decode(memoryview(encoded)[offset:], self.huffman_codes, self.bit_length,
+                                 decode_table, bitwise_codes)
 
         return decoded
 
 
+# Input bytes coded with one model before the adaptive coder rebuilds it
+ADAPTIVE_SEGMENT_SIZE = 32 * 1024
+# Model counts are halved once their total passes this (about two segments),
+# so the model follows statistics that shift along the input
+ADAPTIVE_COUNT_LIMIT = 1 << 16
+
+
+class _AdaptiveModel:
+    """Byte model shared by the adaptive encoder and decoder.
+
+    Every byte starts with a count of one, so the first segment is coded
+    with 8-bit codes; after each segment the counts are updated with its
+    bytes and the length-limited canonical codes are rebuilt.
+    """
+
+    def __init__(self, max_code_length):
+        self.max_code_length = max_code_length
+        self.counts = np.ones(256, dtype=np.int64)
+        self.codes = None
+        self._rebuild()
+
+    def _rebuild(self):
+        freq_dict = dict(enumerate(self.counts.tolist()))
+        self.codes = canonical_codes(code_lengths_for(freq_dict, self.max_code_length))
+
+    def update(self, segment):
+        self.counts += np.bincount(np.frombuffer(segment, dtype=np.uint8), minlength=256)
+        if self.counts.sum() > ADAPTIVE_COUNT_LIMIT:
+            self.counts = (self.counts + 1) >> 1
+        self._rebuild()
+
+
+class AdaptiveHuffmanEncoder:
+    """One-pass Huffman coder with a periodically rebuilt model.
+
+    Input is coded in segments of `segment_size` bytes, each with codes
+    built from the bytes of the segments before it, so no code table is
+    transmitted and nothing has to be counted in advance. feed() returns
+    every segment completed so far; flush() codes the partial segment and
+    the end marker. A segment is its bit length as a varint followed by
+    the packed codes; a zero bit length ends the stream.
+    """
+
+    def __init__(self, segment_size=ADAPTIVE_SEGMENT_SIZE, max_code_length=MAX_CODE_LENGTH):
+        if segment_size <= 0:
+            raise ValueError("segment_size must be positive")
+        self.segment_size = segment_size
+        self._model = _AdaptiveModel(max_code_length)
+        self._pending = bytearray()
+        self.flushed = False
+
+    def _encode_segment(self, segment):
+        payload, bit_length = huffman_encode(segment, self._model.codes)
+        self._model.update(segment)
+        return encode_varint(bit_length) + payload
+
+    def feed(self, data):
+        if self.flushed:
+            raise ValueError("Encoder already flushed")
+        self._pending += data
+        out = []
+        with memoryview(self._pending) as view:
+            full = len(view) - len(view) % self.segment_size
+            for start in range(0, full, self.segment_size):
+                out.append(self._encode_segment(view[start:start + self.segment_size]))
+        del self._pending[:full]
+        return b''.join(out)
+
+    def flush(self):
+        if self.flushed:
+            return b''
+        self.flushed = True
+        out = self._encode_segment(bytes(self._pending)) if self._pending else b''
+        self._pending = bytearray()
+        return out + encode_varint(0)
+
+
+class AdaptiveHuffmanDecoder:
+    """Inverts AdaptiveHuffmanEncoder, one complete segment at a time.
+
+    feed() accepts the stream in chunks of any size and returns the bytes
+    of every segment completed so far; `eof` becomes true at the end marker.
+    Each segment is decoded with the table-driven huffman_decode.
+    """
+
+    def __init__(self, max_code_length=MAX_CODE_LENGTH):
+        self._model = _AdaptiveModel(max_code_length)
+        self._buffer = bytearray()
+        self.eof = False
+
+    def feed(self, data):
+        if self.eof and data:
+            raise ValueError("Unexpected data after the end of the stream")
+        self._buffer += data
+        out = []
+        while not self.eof:
+            try:
+                bit_length, offset = decode_varint(self._buffer)
+            except ValueError:
+                break
+            end = offset + ((bit_length + 7) >> 3)
+            if len(self._buffer) < end:
+                break
+            if bit_length:
+                segment = huffman_decode(bytes(self._buffer[offset:end]), self._model.codes, bit_length)
+                self._model.update(segment)
+                out.append(segment)
+            else:
+                self.eof = True
+            del self._buffer[:end]
+        if self.eof and self._buffer:
+            raise ValueError("Unexpected data after the end of the stream")
+        return b''.join(out)
+
+
+def adaptive_huffman_encode(data, segment_size=ADAPTIVE_SEGMENT_SIZE, max_code_length=MAX_CODE_LENGTH):
+    """Codes bytes with AdaptiveHuffmanEncoder in one call."""
+    encoder = AdaptiveHuffmanEncoder(segment_size, max_code_length)
+    return encoder.feed(data) + encoder.flush()
+
+
+def adaptive_huffman_decode(encoded, max_code_length=MAX_CODE_LENGTH):
+    """Decodes the output of adaptive_huffman_encode."""
+    decoder = AdaptiveHuffmanDecoder(max_code_length)
+    data = decoder.feed(encoded)
+    if not decoder.eof:
+        raise ValueError("Truncated adaptive Huffman stream")
+    return data
+
+
 # 3. BWT Compression
-def create_rotations(text: str) -> list[str]:
-    """Create all possible rotations with animation data"""
-    text = text + "$"
-    n = len(text)
-    rotations = []
+def suffix_array(s, upper):
+    """Builds the suffix array of an integer sequence with SA-IS.
+
+    `s` holds values in ``range(upper + 1)``. A suffix that is a prefix of
+    another sorts first, i.e. the end of the sequence behaves like a unique
+    smallest sentinel. Runs in O(n) time and only allocates flat int lists.
+    """
+    n = len(s)
+    if n == 0:
+        return []
+    if n == 1:
+        return [0]
+    if n == 2:
+        return [0, 1] if s[0] < s[1] else [1, 0]
+
+    sa = [0] * n
+    ls = [False] * n
+    for i in range(n - 2, -1, -1):
+        ls[i] = ls[i + 1] if s[i] == s[i + 1] else s[i] < s[i + 1]
+
+    sum_l = [0] * (upper + 2)
+    sum_s = [0] * (upper + 2)
     for i in range(n):
-        rotation = text[i:] + text[:i]
-        # self.rotations_history.append(rotation)
-        rotations.append(rotation)
-    return rotations
+        if ls[i]:
+            sum_l[s[i] + 1] += 1
+        else:
+            sum_s[s[i]] += 1
+    for i in range(upper + 1):
+        sum_s[i] += sum_l[i]
+        sum_l[i + 1] += sum_s[i]
+
+    def induce(lms):
+        for i in range(n):
+            sa[i] = -1
+        buf = sum_s[:]
+        for d in lms:
+            if d == n:
+                continue
+            sa[buf[s[d]]] = d
+            buf[s[d]] += 1
+        buf = sum_l[:]
+        sa[buf[s[n - 1]]] = n - 1
+        buf[s[n - 1]] += 1
+        for i in range(n):
+            v = sa[i]
+            if v >= 1 and not ls[v - 1]:
+                c = s[v - 1]
+                sa[buf[c]] = v - 1
+                buf[c] += 1
+        buf = sum_l[:]
+        for i in range(n - 1, -1, -1):
+            v = sa[i]
+            if v >= 1 and ls[v - 1]:
+                c = s[v - 1] + 1
+                buf[c] -= 1
+                sa[buf[c]] = v - 1
+
+    lms_map = [-1] * (n + 1)
+    lms = []
+    for i in range(1, n):
+        if not ls[i - 1] and ls[i]:
+            lms_map[i] = len(lms)
+            lms.append(i)
+    m = len(lms)
+
+    induce(lms)
+
+    if m:
+        sorted_lms = [v for v in sa if lms_map[v] != -1]
+        rec_s = [0] * m
+        rec_upper = 0
+        rec_s[lms_map[sorted_lms[0]]] = 0
+        for i in range(1, m):
+            left = sorted_lms[i - 1]
+            right = sorted_lms[i]
+            end_l = lms[lms_map[left] + 1] if lms_map[left] + 1 < m else n
+            end_r = lms[lms_map[right] + 1] if lms_map[right] + 1 < m else n
+            same = True
+            if end_l - left != end_r - right:
+                same = False
+            else:
+                while left < end_l and s[left] == s[right]:
+                    left += 1
+                    right += 1
+                if left == n or s[left] != s[right]:
+                    same = False
+            if not same:
+                rec_upper += 1
+            rec_s[lms_map[sorted_lms[i]]] = rec_upper
+
+        rec_sa = suffix_array(rec_s, rec_upper)
+        for i in range(m):
+            sorted_lms[i] = lms[rec_sa[i]]
+        induce(sorted_lms)
+
+    return sa
+
+
+def create_rotations(data):
+    """Rotations of `data` and an end marker (used by the step-by-step visualization).
+
+    Each rotation is a tuple of byte values in which BWT_END marks where
+    the data ends, so no byte value is reserved as a terminator. Sorted,
+    they are the rows bwt_encode reads its last column from.
+    """
+    symbols = tuple(data) + (BWT_END,)
+    return [symbols[i:] + symbols[:i] for i in range(len(symbols))]
 
 
-def bwt_encode(text):
-    rotations = create_rotations(text)
+def bwt_encode(data):
+    """Returns the BWT last column of `data` and the primary index.
 
-    sorted_rotations = sorted(rotations)
+    Same as bwt_encode_block: the rotations are never materialized, the
+    last column is read off the suffix array and the end marker's row is
+    left out of it, its position being the primary index.
+    """
+    if isinstance(data, str):
+        raise TypeError("BWT works on bytes; encode text first")
+    return bwt_encode_block(data)
 
-    encoded = ''.join(rotation[-1] for rotation in sorted_rotations)
 
-    return encoded, rotations
+def bwt_decode(last_column, primary_index, trace=False):
+    """Inverts the BWT with counting and LF-mapping in linear time.
 
+    The n-round table reconstruction is only run when `trace` is set and
+    the input is at most BWT_TRACE_LIMIT bytes, to give the GUI its
+    step-by-step iterations; otherwise `iterations` is empty.
+    """
+    decoded = bwt_decode_block(last_column, primary_index)
+    if trace and len(last_column) <= BWT_TRACE_LIMIT:
+        return decoded, _bwt_decode_table(last_column, primary_index)
+    return decoded, []
 
-def bwt_decode(bwt: str):
+
+def _bwt_decode_table(last_column, primary_index):
+    """The sorted tables of the n-round reconstruction, one per round."""
+    column = list(last_column)
+    column.insert(primary_index, BWT_END)
     iterations = []
-    table = [''] * len(bwt)
-    for i in range(len(bwt)):
-        table = sorted([bwt[j] + table[j] for j in range(len(bwt))])
+    table = [()] * len(column)
+    for _ in range(len(column)):
+        table = sorted([(column[j],) + table[j] for j in range(len(column))])
         iterations.append(table)
+    return iterations
+
+
+def _check_primary_index(last_column, primary_index):
+    if len(last_column) and not 1 <= primary_index <= len(last_column):
+        raise ValueError("Invalid BWT primary index")
+
+
+def bwt_encode_block(block):
+    """BWT of one block of bytes, returned as (last column, primary index).
+
+    No terminator byte is added to the data, so blocks may contain any
+    byte value. The suffix array is built with a virtual sentinel that
+    sorts first; its row is left out of the last column and its position
+    is recorded as the primary index. `block` is read in place, so a
+    memoryview slice of a mapped file is never copied.
+    """
+    data = block
+    if not len(data):
+        return b'', 0
+
+    sa = suffix_array(data, 255)
+    column = bytes([data[i - 1] for i in sa])
+    k = sa.index(0)
+
+    return bytes((data[-1],)) + column[:k] + column[k + 1:], k + 1
+
+
+def bwt_decode_block(last_column, primary_index):
+    """Inverts bwt_encode_block with LF-mapping."""
+    last_column = bytes(last_column)
+    n = len(last_column)
+    if n == 0:
+        return b''
+    _check_primary_index(last_column, primary_index)
+
+    # Row 0 of the first column is the virtual sentinel
+    starts = [0] * 256
+    total = 1
+    counts = Counter(last_column)
+    for byte in range(256):
+        starts[byte] = total
+        total += counts.get(byte, 0)
+
+    full_column = last_column[:primary_index] + b'\0' + last_column[primary_index:]
+    next_row = [0] * (n + 1)
+    for row, byte in enumerate(last_column[:primary_index]):
+        next_row[starts[byte]] = row
+        starts[byte] += 1
+    for row, byte in enumerate(last_column[primary_index:], primary_index + 1):
+        next_row[starts[byte]] = row
+        starts[byte] += 1
+
+    decoded = bytearray(n)
+    row = primary_index
+    for i in range(n):
+        row = next_row[row]
+        decoded[i] = full_column[row]
+
+    return bytes(decoded)
+
+
+def bwt_encode_blocks(data, block_size=BWT_BLOCK_SIZE):
+    """Yields (last column, primary index) for each block of `data`.
+
+    Blocks are transformed independently and lazily, so peak memory is
+    bounded by `block_size` rather than by the size of the input.
+    """
+    if block_size <= 0:
+        raise ValueError("block_size must be positive")
+    view = memoryview(data)
+    for start in range(0, len(view), block_size):
+        yield bwt_encode_block(view[start:start + block_size])
+
+
+def bwt_decode_blocks(blocks):
+    """Yields the decoded bytes of each (last column, primary index) pair."""
+    for last_column, primary_index in blocks:
+        yield bwt_decode_block(last_column, primary_index)
+
+
+# 4. Move-to-Front (MTF) and zero-run coding
+# Zero-run symbols: bijective base-2 digits of a run of MTF rank 0 (as in bzip2)
+RUNA = 0
+RUNB = 1
+# Prefix for MTF ranks 254 and 255, which do not fit after the +1 shift
+ZERO_RUN_ESCAPE = 0xFF
+
+_SHIFT_UP = bytes([0] + list(range(2, 255)) + [0, 0])
+_SHIFT_DOWN = bytes([0, 0] + list(range(1, 254)) + [0])
+_ZERO_RUN_ENCODE = re.compile(rb'(\x00+|[\xfe\xff])')
+_ZERO_RUN_DECODE = re.compile(rb'([\x00\x01]+|\xff[\x00\x01])')
+
+
+def mtf_encode(data, alphabet=None):
+    """Move-to-front transform: replaces each byte by its rank in a recency list.
+
+    The list is a bytearray, so finding a byte and shifting the list are
+    single C-level operations; repeats (rank 0) cost one comparison. It
+    starts as `alphabet` (a permutation of the 256 byte values), by default
+    in byte order.
+    """
+    table = bytearray(range(256) if alphabet is None else alphabet)
+    ranks = bytearray(len(data))
+    for i, byte in enumerate(data):
+        if byte == table[0]:
+            continue
+        rank = table.index(byte)
+        ranks[i] = rank
+        table[1:rank + 1] = table[:rank]
+        table[0] = byte
+    return bytes(ranks)
+
+
+def mtf_decode(ranks, alphabet=None):
+    """Inverts mtf_encode."""
+    table = bytearray(range(256) if alphabet is None else alphabet)
+    data = bytearray(len(ranks))
+    front = table[0]
+    for i, rank in enumerate(ranks):
+        if rank:
+            front = table[rank]
+            table[1:rank + 1] = table[:rank]
+            table[0] = front
+        data[i] = front
+    return bytes(data)
+
+
+def _zero_run_symbols(length):
+    symbols = bytearray()
+    length -= 1
+    while True:
+        symbols.append(RUNB if length & 1 else RUNA)
+        if length < 2:
+            return bytes(symbols)
+        length = (length - 2) >> 1
+
+
+def zero_run_encode(ranks):
+    """Codes runs of MTF rank 0 as RUNA/RUNB digits and shifts other ranks up by one.
+
+    After BWT and MTF most ranks are zero, so the output is much shorter
+    than the input and its alphabet is small. Ranks 254 and 255 are written
+    as ZERO_RUN_ESCAPE followed by 0 or 1.
+    """
+    parts = _ZERO_RUN_ENCODE.split(bytes(ranks))
+    runs = {}
+    for i in range(1, len(parts), 2):
+        part = parts[i]
+        if part[0] == 0:
+            symbols = runs.get(len(part))
+            if symbols is None:
+                symbols = runs[len(part)] = _zero_run_symbols(len(part))
+            parts[i] = symbols
+        else:
+            parts[i] = bytes((ZERO_RUN_ESCAPE, part[0] - 254))
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].translate(_SHIFT_UP)
+    return b''.join(parts)
+
+
+def zero_run_decode(symbols):
+    """Inverts zero_run_encode."""
+    parts = _ZERO_RUN_DECODE.split(bytes(symbols))
+    for i in range(1, len(parts), 2):
+        part = parts[i]
+        if part[0] == ZERO_RUN_ESCAPE:
+            parts[i] = bytes((254 + part[1],))
+            continue
+        length = 0
+        weight = 1
+        for symbol in part:
+            length += weight << symbol
+            weight <<= 1
+        parts[i] = bytes(length)
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].translate(_SHIFT_DOWN)
+    return b''.join(parts)
+
+
+# 5. Composable pipeline
+# Stages compress_block runs by default
+DEFAULT_STAGES = ('bwt', 'mtf', 'huffman')
+
+
+class BWTStage:
+    """BWT of each block; a block is written as varint length, varint primary index, last column."""
+
+    name = 'bwt'
+
+    def __init__(self, block_size=BWT_BLOCK_SIZE, **options):
+        self.block_size = block_size
+
+    def encode(self, data):
+        out = bytearray()
+        for last_column, primary_index in bwt_encode_blocks(data, self.block_size):
+            out += encode_varint(len(last_column))
+            out += encode_varint(primary_index)
+            out += last_column
+        return bytes(out)
+
+    def decode(self, data):
+        out = bytearray()
+        offset = 0
+        while offset < len(data):
+            length, offset = decode_varint(data, offset)
+            primary_index, offset = decode_varint(data, offset)
+            if offset + length > len(data):
+                raise ValueError("Truncated BWT block")
+            out += bwt_decode_block(data[offset:offset + length], primary_index)
+            offset += length
+        return bytes(out)
+
+
+class MTFStage:
+    """Move-to-front followed by zero-run coding.
+
+    The recency list starts as `alphabet`, or as the trained MTF alphabet
+    of `dictionary` when it has one.
+    """
+
+    name = 'mtf'
+
+    def __init__(self, alphabet=None, dictionary=None, **options):
+        if alphabet is None and dictionary is not None:
+            alphabet = dictionary.mtf_alphabet
+        self.alphabet = alphabet
+
+    def encode(self, data):
+        return zero_run_encode(mtf_encode(data, self.alphabet))
+
+    def decode(self, data):
+        return mtf_decode(zero_run_decode(data), self.alphabet)
+
+
+class RLEStage:
+    """Binary run-length coding (rle_encode)."""
+
+    name = 'rle'
+
+    def __init__(self, **options):
+        pass
+
+    def encode(self, data):
+        return rle_encode(data)
+
+    def decode(self, data):
+        return rle_decode(data)
+
+
+class HuffmanStage:
+    """Canonical Huffman coding; `coder` is the HuffmanCompression of the last call.
+
+    `codebook_cache` is an optional CodebookCache shared by every call and
+    `dictionary` an optional HuffmanDictionary to code with.
+    """
+
+    name = 'huffman'
+
+    def __init__(self, max_code_length=MAX_CODE_LENGTH, codebook_cache=None, dictionary=None,
+                 **options):
+        self.max_code_length = max_code_length
+        self.codebook_cache = codebook_cache
+        self.dictionary = dictionary
+        self.coder = None
+
+    def _coder(self):
+        return HuffmanCompression(self.max_code_length, cache=self.codebook_cache,
+                                  dictionary=self.dictionary)
+
+    def encode(self, data):
+        self.coder = self._coder()
+        return self.coder.encode(bytes(data))
+
+    def decode(self, data):
+        self.coder = self._coder()
+        return self.coder.decode(bytes(data))
+
+
+# Stage classes by name, for Pipeline and the container header
+PIPELINE_STAGES = {}
+
 
-    decoded = next(row[:-1] for row in table if row.endswith('$'))
+def register_stage(cls):
+    """Makes a stage class available to Pipeline under `cls.name`."""
+    PIPELINE_STAGES[cls.name] = cls
+    return cls
 
-    return decoded, iterations
 
+for _stage in (BWTStage, MTFStage, RLEStage, HuffmanStage):
+    register_stage(_stage)
+
+
+class Pipeline:
+    """A sequence of stages sharing a bytes-in/bytes-out contract.
+
+    `stages` holds registered stage names or stage objects (anything with
+    `name`, `encode` and `decode`); `options` such as block_size and
+    max_code_length are passed to the stages built from names. encode()
+    runs the stages in order and decode() in reverse, handing bytes from
+    one stage to the next. Each observer is called as
+    observer(stage, operation, data_in, data_out) after every stage, with
+    operation 'encode' or 'decode'; a StageProfile records each stage as
+    "<name> <operation>".
+    """
+
+    def __init__(self, stages=DEFAULT_STAGES, profile=None, observers=(), **options):
+        self.stages = []
+        for stage in stages:
+            if isinstance(stage, str):
+                if stage not in PIPELINE_STAGES:
+                    raise ValueError(f"Unknown pipeline stage {stage!r}")
+                stage = PIPELINE_STAGES[stage](**options)
+            self.stages.append(stage)
+        self.profile = profile
+        self.observers = list(observers)
+
+    @property
+    def names(self):
+        return tuple(stage.name for stage in self.stages)
+
+    def _apply(self, stages, operation, data):
+        for stage in stages:
+            result = _run_stage(self.profile, f"{stage.name} {operation}", getattr(stage, operation), data)
+            for observer in self.observers:
+                observer(stage, operation, data, result)
+            data = result
+        return data
+
+    def encode(self, data):
+        return self._apply(self.stages, 'encode', data)
+
+    def decode(self, data):
+        return self._apply(reversed(self.stages), 'decode', data)
+
+
+# 6. Block pipeline and container format
+def compress_block(block, max_code_length=MAX_CODE_LENGTH, profile=None, stages=DEFAULT_STAGES):
+    """Compresses one block by running `stages` as a Pipeline.
+
+    The whole block is a single BWT block, so with the default stages the
+    payload is the Huffman coding of the MTF and zero-run coded BWTStage
+    output (varint length, varint primary index, last column). A
+    StageProfile passed as `profile` receives the timings of each stage.
+    """
+    return Pipeline(stages, profile, block_size=max(len(block), 1),
+                    max_code_length=max_code_length).encode(block)
+
+
+def decompress_block(payload, profile=None, stages=DEFAULT_STAGES):
+    """Inverts compress_block."""
+    return Pipeline(stages, profile).decode(payload)
+
+
+CONTAINER_MAGIC = b'BWRH'
+CONTAINER_FOOTER_MAGIC = b'HRWB'
+CONTAINER_VERSION = 2
+CONTAINER_EXTENSION = '.bwz'
+STAGE_IDS = {'bwt': 1, 'mtf': 2, 'huffman': 3, 'rle': 4}
+
+# magic, version, block size, max code length, stage count (stage ids follow)
+_HEADER = struct.Struct('>4sBIBB')
+# payload length, original length, CRC32 of the payload; all zero ends the blocks
+_FRAME = struct.Struct('>III')
+# frame offset, payload length, original length, CRC32 of the payload
+_INDEX_ENTRY = struct.Struct('>QIII')
+# index offset, block count, footer magic
+_FOOTER = struct.Struct('>QI4s')
+
+
+class ContainerError(ValueError):
+    """Raised when a compressed container is malformed or corrupted."""
+
+
+class BlockInfo:
+    """Index entry of one compressed block."""
+    __slots__ = ('offset', 'payload_length', 'original_length', 'crc', 'original_offset')
+
+    def __init__(self, offset, payload_length, original_length, crc, original_offset=0):
+        self.offset = offset
+        self.payload_length = payload_length
+        self.original_length = original_length
+        self.crc = crc
+        self.original_offset = original_offset
+
+
+class ContainerWriter:
+    """Writes compressed blocks into the binary container format.
+
+    Layout: header (magic, version, block size, max code length, stage ids),
+    then one frame per block (payload length, original length, CRC32,
+    payload), an all-zero end frame, the block index and a fixed-size
+    footer pointing at the index. Only sequential writes are used, so `fp`
+    does not need to be seekable.
+    """
+
+    def __init__(self, fp, block_size=BWT_BLOCK_SIZE, max_code_length=MAX_CODE_LENGTH,
+                 stages=DEFAULT_STAGES, profile=None):
+        self.fp = fp
+        self.profile = profile
+        self.block_size = block_size
+        self.max_code_length = max_code_length
+        self.stages = tuple(stages)
+        unknown = [stage for stage in self.stages if stage not in STAGE_IDS]
+        if unknown:
+            raise ContainerError(f"Stages without a container id: {unknown}")
+        self.blocks = []
+        self.original_size = 0
+        self.closed = False
+        header = _HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, block_size,
+                              max_code_length or 0, len(self.stages))
+        self.offset = 0
+        self._write(header + bytes(STAGE_IDS[stage] for stage in self.stages))
+
+    def _write(self, data):
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def write_block(self, payload, original_length):
+        """Appends a block payload produced by compress_block."""
+        crc = zlib.crc32(payload)
+        self.blocks.append(BlockInfo(self.offset, len(payload), original_length, crc, self.original_size))
+        self.original_size += original_length
+        self._write(_FRAME.pack(len(payload), original_length, crc))
+        self._write(payload)
+
+    def write(self, data):
+        """Splits `data` into blocks, compresses and appends them."""
+        # Release every view even on error, so a caller's mmap can still close
+        with memoryview(data) as view:
+            for start in range(0, len(view), self.block_size):
+                with view[start:start + self.block_size] as block:
+                    self.write_block(compress_block(block, self.max_code_length, self.profile, self.stages),
+                                     len(block))
+
+    def close(self):
+        """Writes the end frame, the block index and the footer."""
+        if self.closed:
+            return
+        self.closed = True
+        self._write(_FRAME.pack(0, 0, 0))
+        index_offset = self.offset
+        self._write(b''.join(
+            _INDEX_ENTRY.pack(block.offset, block.payload_length, block.original_length, block.crc)
+            for block in self.blocks
+        ))
+        self._write(_FOOTER.pack(index_offset, len(self.blocks), CONTAINER_FOOTER_MAGIC))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # A failed write must not leave a container that looks complete
+        if exc_info[0] is None:
+            self.close()
+
+
+def parse_container_header(data):
+    """Parses a container header, returning (params dict, header length)."""
+    if len(data) < _HEADER.size:
+        raise ContainerError("Truncated container header")
+    magic, version, block_size, max_code_length, stage_count = _HEADER.unpack_from(data)
+    if magic != CONTAINER_MAGIC:
+        raise ContainerError("Not a compressed container (bad magic)")
+    if version != CONTAINER_VERSION:
+        raise ContainerError(f"Unsupported container version {version}")
+    end = _HEADER.size + stage_count
+    if len(data) < end:
+        raise ContainerError("Truncated container header")
+    names = {stage_id: name for name, stage_id in STAGE_IDS.items()}
+    try:
+        stages = tuple(names[stage_id] for stage_id in data[_HEADER.size:end])
+    except KeyError as e:
+        raise ContainerError(f"Unknown stage id {e}") from None
+    params = {'block_size': block_size, 'max_code_length': max_code_length or None, 'stages': stages}
+    return params, end
+
+
+class ContainerReader:
+    """Random access to the blocks of a container in a seekable file.
+
+    Only the header, footer and index are read up front; blocks are read
+    and checked against their CRC32 on demand.
+    """
+
+    def __init__(self, fp, profile=None):
+        self.fp = fp
+        self.profile = profile
+        fp.seek(0)
+        head = fp.read(_HEADER.size + 255)
+        self.params, self.header_length = parse_container_header(head)
+
+        fp.seek(0, 2)
+        end = fp.tell()
+        if end < self.header_length + _FRAME.size + _FOOTER.size:
+            raise ContainerError("Truncated container")
+        fp.seek(end - _FOOTER.size)
+        index_offset, count, magic = _FOOTER.unpack(fp.read(_FOOTER.size))
+        if magic != CONTAINER_FOOTER_MAGIC or index_offset + count * _INDEX_ENTRY.size != end - _FOOTER.size:
+            raise ContainerError("Corrupted container footer")
+
+        fp.seek(index_offset)
+        index = fp.read(count * _INDEX_ENTRY.size)
+        self.blocks = []
+        original_offset = 0
+        for offset, payload_length, original_length, crc in _INDEX_ENTRY.iter_unpack(index):
+            self.blocks.append(BlockInfo(offset, payload_length, original_length, crc, original_offset))
+            original_offset += original_length
+        self.original_size = original_offset
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def read_block(self, i):
+        """Returns the verified payload of block `i`."""
+        block = self.blocks[i]
+        self.fp.seek(block.offset)
+        frame = self.fp.read(_FRAME.size)
+        if len(frame) < _FRAME.size or _FRAME.unpack(frame) != (
+                block.payload_length, block.original_length, block.crc):
+            raise ContainerError(f"Block {i}: frame does not match the index")
+        payload = self.fp.read(block.payload_length)
+        if len(payload) < block.payload_length or zlib.crc32(payload) != block.crc:
+            raise ContainerError(f"Block {i}: CRC32 mismatch")
+        return payload
+
+    def decompress_block(self, i):
+        data = decompress_block(self.read_block(i), self.profile, self.params['stages'])
+        if len(data) != self.blocks[i].original_length:
+            raise ContainerError(f"Block {i}: decompressed length mismatch")
+        return data
+
+    def verify(self):
+        """Checks every block's frame and CRC32 without decompressing."""
+        for i in range(len(self.blocks)):
+            self.read_block(i)
+
+    def __iter__(self):
+        for i in range(len(self.blocks)):
+            yield self.decompress_block(i)
+
+
+def compress(data, block_size=BWT_BLOCK_SIZE, max_code_length=MAX_CODE_LENGTH, profile=None,
+             stages=DEFAULT_STAGES):
+    """Compresses bytes into an in-memory container."""
+    out = io.BytesIO()
+    with ContainerWriter(out, block_size, max_code_length, stages, profile) as writer:
+        writer.write(data)
+    return out.getvalue()
+
+
+def decompress(container, profile=None):
+    """Decompresses an in-memory container."""
+    return b''.join(ContainerReader(io.BytesIO(container), profile))
+
+
+# 7. Streaming compression
+# Bytes read from the source per step by compress_stream/decompress_stream
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+class Compressor:
+    """Incremental compressor producing the container format.
+
+    feed() buffers input until a full block is available and returns the
+    container bytes produced so far; flush() compresses the final partial
+    block and returns the end frame, index and footer. At most one block
+    of input is held in memory.
+    """
+
+    def __init__(self, block_size=BWT_BLOCK_SIZE, max_code_length=MAX_CODE_LENGTH,
+                 stages=DEFAULT_STAGES):
+        self._out = io.BytesIO()
+        self._writer = ContainerWriter(self._out, block_size, max_code_length, stages)
+        self._pending = bytearray()
+        self.block_size = block_size
+
+    def _drain(self):
+        data = self._out.getvalue()
+        self._out.seek(0)
+        self._out.truncate()
+        return data
+
+    def feed(self, data):
+        if self._writer.closed:
+            raise ValueError("Compressor already flushed")
+        self._pending += data
+        if len(self._pending) >= self.block_size:
+            full = len(self._pending) - len(self._pending) % self.block_size
+            with memoryview(self._pending) as view:
+                self._writer.write(view[:full])
+            del self._pending[:full]
+        return self._drain()
+
+    def flush(self):
+        if self._pending:
+            self._writer.write(self._pending)
+            self._pending = bytearray()
+        self._writer.close()
+        return self._drain()
+
+
+class Decompressor:
+    """Incremental decompressor for the container format.
+
+    feed() accepts container bytes in chunks of any size and returns the
+    data of every block completed so far, after checking its CRC32. `eof`
+    becomes true once the footer has been read and checked.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._state = 'header'
+        self._blocks = []
+        self._offset = 0
+        self.params = None
+        self.eof = False
+
+    def _consume(self, n):
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        self._offset += n
+        return data
+
+    def feed(self, data):
+        if self.eof and data:
+            raise ContainerError("Unexpected data after the container footer")
+        self._buffer += data
+        output = []
+
+        if self._state == 'header':
+            # The last fixed header field is the number of stage ids that follow
+            if (len(self._buffer) < _HEADER.size
+                    or len(self._buffer) < _HEADER.size + self._buffer[_HEADER.size - 1]):
+                return b''
+            self.params, length = parse_container_header(self._buffer)
+            self._consume(length)
+            self._state = 'blocks'
+
+        while self._state == 'blocks' and len(self._buffer) >= _FRAME.size:
+            payload_length, original_length, crc = _FRAME.unpack_from(self._buffer)
+            if payload_length == 0:
+                self._consume(_FRAME.size)
+                self._state = 'index'
+                break
+            if len(self._buffer) < _FRAME.size + payload_length:
+                break
+            offset = self._offset
+            self._consume(_FRAME.size)
+            payload = self._consume(payload_length)
+            if zlib.crc32(payload) != crc:
+                raise ContainerError(f"Block {len(self._blocks)}: CRC32 mismatch")
+            block = decompress_block(payload, stages=self.params['stages'])
+            if len(block) != original_length:
+                raise ContainerError(f"Block {len(self._blocks)}: decompressed length mismatch")
+            self._blocks.append((offset, payload_length, original_length, crc))
+            output.append(block)
+
+        if self._state == 'index':
+            trailer = len(self._blocks) * _INDEX_ENTRY.size + _FOOTER.size
+            if len(self._buffer) > trailer:
+                raise ContainerError("Unexpected data after the container footer")
+            if len(self._buffer) == trailer:
+                index_offset = self._offset
+                index = self._consume(trailer - _FOOTER.size)
+                footer_offset, count, magic = _FOOTER.unpack(self._consume(_FOOTER.size))
+                if (magic != CONTAINER_FOOTER_MAGIC or footer_offset != index_offset
+                        or count != len(self._blocks)
+                        or list(_INDEX_ENTRY.iter_unpack(index)) != self._blocks):
+                    raise ContainerError("Block index does not match the blocks")
+                self._state = 'done'
+                self.eof = True
+
+        return b''.join(output)
+
+
+def compress_stream(src, dst, block_size=BWT_BLOCK_SIZE, max_code_length=MAX_CODE_LENGTH,
+                    chunk_size=STREAM_CHUNK_SIZE, stages=DEFAULT_STAGES):
+    """Compresses the binary file object `src` into `dst` in bounded memory."""
+    compressor = Compressor(block_size, max_code_length, stages)
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        dst.write(compressor.feed(chunk))
+    dst.write(compressor.flush())
+
+
+def decompress_stream(src, dst, chunk_size=STREAM_CHUNK_SIZE):
+    """Decompresses the binary file object `src` into `dst` in bounded memory."""
+    decompressor = Decompressor()
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        dst.write(decompressor.feed(chunk))
+    if not decompressor.eof:
+        raise ContainerError("Truncated container")
+
+
+@contextmanager
+def _replace_on_success(dst_path):
+    """Yields a temporary path next to `dst_path` that replaces it if the body succeeds.
+
+    On any exception, including KeyboardInterrupt, the partial output is
+    deleted and `dst_path` is left untouched.
+    """
+    tmp_path = f"{dst_path}.{os.getpid()}.part"
+    try:
+        yield tmp_path
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    os.replace(tmp_path, dst_path)
+
+
+def compress_file(src_path, dst_path, block_size=BWT_BLOCK_SIZE, max_code_length=MAX_CODE_LENGTH,
+                  stages=DEFAULT_STAGES):
+    """Compresses a file into a container file, reading it through mmap.
+
+    Blocks are memoryview slices of the mapping, so the input is paged in
+    by the OS as the BWT reads it and is never loaded as a whole. The
+    output is written under a temporary name and only renamed to
+    `dst_path` once the container is complete.
+    """
+    with _replace_on_success(dst_path) as tmp_path, open(tmp_path, 'wb') as dst, \
+            ContainerWriter(dst, block_size, max_code_length, stages) as writer:
+        if not os.path.getsize(src_path):
+            return
+        with open(src_path, 'rb') as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                writer.write(view)
+
+
+def decompress_file(src_path, dst_path):
+    """Decompresses a container file, reading its blocks through mmap."""
+    with open(src_path, 'rb') as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with _replace_on_success(dst_path) as tmp_path, open(tmp_path, 'wb') as dst:
+            for data in ContainerReader(mapped):
+                dst.write(data)
+
+
+# 8. Parallel block compression
+# Source file mapped once per worker process by _open_worker_source
+_worker_source = None
+
+
+def _open_worker_source(path):
+    global _worker_source
+    with open(path, 'rb') as f:
+        _worker_source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _compress_source_block(offset, length, max_code_length, stages):
+    return compress_block(_worker_source[offset:offset + length], max_code_length, stages=stages)
+
+
+def _ordered_map(pool, fn, *iterables, window):
+    """Like pool.map, but keeps at most `window` tasks in flight.
+
+    Tasks that have not started are cancelled if the generator is closed
+    early.
+    """
+    pending = deque()
+    try:
+        for args in zip(*iterables):
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def compress_file_parallel(src_path, dst_path, block_size=BWT_BLOCK_SIZE,
+                           max_code_length=MAX_CODE_LENGTH, workers=None, stages=DEFAULT_STAGES,
+                           progress=None):
+    """Compresses a file with one block per task on a process pool.
+
+    Each worker maps the source file once, so tasks only carry a block's
+    offset and length and no input data is pickled. Payloads are written
+    in block order, so the output is identical to compress_stream's.
+    `progress`, if given, is called as progress(done, total) with the
+    input bytes compressed so far after each block; an exception it raises
+    stops the pool and discards the partial output.
+    """
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(src_path)
+    offsets = range(0, size, block_size)
+    lengths = [min(block_size, size - offset) for offset in offsets]
+
+    with _replace_on_success(dst_path) as tmp_path, open(tmp_path, 'wb') as dst, \
+            ContainerWriter(dst, block_size, max_code_length, stages) as writer:
+        if not size:
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_source,
+                                 initargs=(src_path,)) as pool:
+            payloads = _ordered_map(pool, _compress_source_block, offsets, lengths,
+                                    repeat(max_code_length), repeat(tuple(stages)),
+                                    window=2 * workers)
+            done = 0
+            with closing(payloads):
+                for payload, length in zip(payloads, lengths):
+                    writer.write_block(payload, length)
+                    done += length
+                    if progress is not None:
+                        progress(done, size)
+
+
+# Container and output file opened once per worker process by _open_worker_files
+_worker_reader = None
+_worker_output = None
+
+
+def _open_worker_files(src_path, dst_path):
+    global _worker_reader, _worker_output
+    _open_worker_source(src_path)
+    _worker_reader = ContainerReader(_worker_source)
+    _worker_output = open(dst_path, 'r+b')
+
+
+def _decompress_source_block(i):
+    data = _worker_reader.decompress_block(i)
+    _worker_output.seek(_worker_reader.blocks[i].original_offset)
+    _worker_output.write(data)
+    _worker_output.flush()
+    return len(data)
+
+
+def decompress_file_parallel(src_path, dst_path, workers=None, progress=None):
+    """Decompresses a container file with one block per task on a process pool.
+
+    The block index gives every block's place in the output, so the output
+    file is sized up front and each worker writes its blocks straight to
+    their final offsets; only block numbers travel between processes.
+    `progress` is called as in compress_file_parallel, with output bytes.
+    """
+    workers = workers or os.cpu_count() or 1
+    with open(src_path, 'rb') as src:
+        reader = ContainerReader(src)
+        count = len(reader)
+        original_size = reader.original_size
+
+    with _replace_on_success(dst_path) as tmp_path:
+        with open(tmp_path, 'wb') as dst:
+            dst.truncate(original_size)
+        if not count:
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_files,
+                                 initargs=(src_path, tmp_path)) as pool:
+            done = 0
+            with closing(pool.map(_decompress_source_block, range(count), chunksize=1)) as lengths:
+                for length in lengths:
+                    done += length
+                    if progress is not None:
+                        progress(done, original_size)
@@ -0,0 +1,92 @@
+"""Ratio, throughput and latency of adaptive Huffman coding against the static coder.
+
+Run from the repository root:
+
+    python benchmarks/bench_adaptive_huffman.py [size] [segment_kb]
+
+The static coder (HuffmanCompression) counts the whole input before it
+emits anything; the adaptive coder emits each segment as soon as it is
+complete, so its latency is the time to code one segment.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_compression_tool import (
+    ADAPTIVE_SEGMENT_SIZE, AdaptiveHuffmanEncoder, HuffmanCompression,
+    adaptive_huffman_decode,
+)
+
+
+def english(size, rng):
+    words = ("the of and to in a is that for it as was with be by on not he this are or his "
+             "from at which but have an they you were her she there been one all we their").split()
+    out = bytearray()
+    while len(out) < size:
+        out += (' '.join(rng.choices(words, k=12)) + '. ').encode()
+    return bytes(out[:size])
+
+
+def logs(size, rng):
+    out = bytearray()
+    while len(out) < size:
+        out += (f"12:{rng.randrange(60):02d}:{rng.randrange(60):02d} "
+                f"{rng.choice(('INFO', 'WARN', 'ERROR'))} id={rng.randrange(1 << 16):04x}\n").encode()
+    return bytes(out[:size])
+
+
+def shifting(size, rng):
+    """Text, then hex dump, then binary: statistics change along the input."""
+    third = size // 3
+    return english(third, rng) + rng.randbytes(third // 2).hex().encode() + \
+        bytes(rng.choices(range(16), k=size - 2 * third))
+
+
+CORPORA = (("english", english), ("logs", logs), ("shifting", shifting))
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    segment_size = int(sys.argv[2]) * 1024 if len(sys.argv) > 2 else ADAPTIVE_SEGMENT_SIZE
+
+    for name, generate in CORPORA:
+        data = generate(size, random.Random(0))
+
+        start = time.perf_counter()
+        static = HuffmanCompression().encode(data)
+        static_encode = time.perf_counter() - start
+        start = time.perf_counter()
+        assert HuffmanCompression().decode(static) == data
+        static_decode = time.perf_counter() - start
+
+        encoder = AdaptiveHuffmanEncoder(segment_size)
+        start = time.perf_counter()
+        first_output = None
+        parts = []
+        for offset in range(0, len(data), 4096):
+            parts.append(encoder.feed(data[offset:offset + 4096]))
+            if first_output is None and parts[-1]:
+                first_output = time.perf_counter() - start
+        parts.append(encoder.flush())
+        adaptive_encode = time.perf_counter() - start
+        adaptive = b''.join(parts)
+        start = time.perf_counter()
+        assert adaptive_huffman_decode(adaptive) == data
+        adaptive_decode = time.perf_counter() - start
+
+        print(f"{name} ({len(data)} bytes, {segment_size // 1024} KB segments)")
+        print(f"  {'static':>8}: {len(static) / len(data) * 100:5.1f}%  "
+              f"encode {len(data) / static_encode / 1e6:6.2f} MB/s  "
+              f"decode {len(data) / static_decode / 1e6:6.2f} MB/s  "
+              f"first output after {static_encode * 1000:7.1f} ms")
+        print(f"  {'adaptive':>8}: {len(adaptive) / len(data) * 100:5.1f}%  "
+              f"encode {len(data) / adaptive_encode / 1e6:6.2f} MB/s  "
+              f"decode {len(data) / adaptive_decode / 1e6:6.2f} MB/s  "
+              f"first output after {(first_output or adaptive_encode) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Huffman coding of many small messages with and without a CodebookCache.
+
+Run from the repository root:
+
+    python benchmarks/bench_codebook_cache.py [messages] [message_size]
+
+Messages are drawn from the same word distribution, like records of one
+log or protocol, so their histograms are similar but rarely identical.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_compression_tool import CodebookCache, HuffmanCompression
+
+
+def messages(count, size, seed=0):
+    rng = random.Random(seed)
+    words = ("GET POST /api/users /api/orders status=200 status=404 ms= id= "
+             "user= INFO WARN ERROR the of and to in").split()
+    out = []
+    for _ in range(count):
+        text = ' '.join(rng.choices(words, k=size // 4)).encode()
+        out.append(text[:size])
+    return out
+
+
+def measure(run, items):
+    start = time.perf_counter()
+    results = [run(item) for item in items]
+    return time.perf_counter() - start, results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    data = messages(count, size)
+
+    plain_encode, plain = measure(lambda m: HuffmanCompression().encode(m), data)
+    plain_decode, decoded = measure(lambda m: HuffmanCompression().decode(m), plain)
+    assert decoded == data
+
+    encode_cache = CodebookCache()
+    decode_cache = CodebookCache()
+    cached_encode, cached = measure(lambda m: HuffmanCompression(cache=encode_cache).encode(m), data)
+    cached_decode, decoded = measure(lambda m: HuffmanCompression(cache=decode_cache).decode(m), cached)
+    assert decoded == data
+
+    print(f"{count} messages of {size} bytes")
+    for name, encode, decode, payloads in (("no cache", plain_encode, plain_decode, plain),
+                                           ("cache", cached_encode, cached_decode, cached)):
+        print(f"{name:>9}: encode {encode / count * 1e6:8.1f} us/msg  "
+              f"decode {decode / count * 1e6:8.1f} us/msg  "
+              f"output {sum(map(len, payloads))} bytes")
+    print(f"encode cache: {encode_cache.info()}")
+    print(f"decode cache: {decode_cache.info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Short records coded with per-message tables against a trained dictionary.
+
+Run from the repository root:
+
+    python benchmarks/bench_dictionary.py [records] [record_size] [tables]
+
+Half of the generated records train the dictionary and the other half
+are coded, so the dictionary never sees the records it is measured on.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_compression_tool import HuffmanCompression, HuffmanDictionary
+
+
+def records(count, size, seed=0):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(count):
+        record = (f'{{"user":{rng.randrange(10_000)},"event":"{rng.choice(("view", "click", "buy"))}",'
+                  f'"path":"{rng.choice(("/", "/cart", "/search?q=shoes", "/item/42"))}",'
+                  f'"ms":{rng.randrange(1, 900)}}}').encode()
+        out.append((record * (size // len(record) + 1))[:size])
+    return out
+
+
+def measure(run, items):
+    start = time.perf_counter()
+    results = [run(item) for item in items]
+    return time.perf_counter() - start, results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+    tables = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    data = records(2 * count, size)
+    training, data = data[:count], data[count:]
+
+    start = time.perf_counter()
+    dictionary = HuffmanDictionary.train(training, tables=tables)
+    train_time = time.perf_counter() - start
+    print(f"{count} records of {size} bytes; dictionary {dictionary.dict_id:#010x}, "
+          f"{len(dictionary)} table(s), {len(dictionary.to_bytes())} bytes, "
+          f"trained in {train_time * 1000:.1f} ms")
+
+    for name, coder in (("per-message", HuffmanCompression),
+                        ("dictionary", lambda: HuffmanCompression(dictionary=dictionary))):
+        encode, payloads = measure(lambda record: coder().encode(record), data)
+        decode, decoded = measure(lambda payload: coder().decode(payload), payloads)
+        assert decoded == data
+        total = sum(map(len, payloads))
+        print(f"{name:>12}: {total / sum(map(len, data)) * 100:5.1f}%  "
+              f"encode {encode / count * 1e6:8.1f} us/record  "
+              f"decode {decode / count * 1e6:8.1f} us/record")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Throughput of the table-driven Huffman decoder against the bit-by-bit one.
+
+Run from the repository root:
+
+    python benchmarks/bench_huffman_decode.py [size]
+"""
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_compression_tool import (
+    build_huffman_tree, generate_huffman_codes, huffman_encode, huffman_decode
+)
+
+
+def bitwise_huffman_decode(encoded_bits, code_table):
+    """The previous decoder: grows a string buffer one bit at a time."""
+    reverse_table = {code: symbol for symbol, code in code_table.items()}
+
+    decoded_output = []
+    buffer = ""
+
+    for bit in encoded_bits:
+        buffer += bit
+        if buffer in reverse_table:
+            decoded_output.append(reverse_table[buffer])
+            buffer = ""
+
+    return bytes(decoded_output)
+
+
+def sample_text(size, seed=0):
+    """English-like text with a skewed byte distribution."""
+    rng = random.Random(seed)
+    words = ("the of and to in is was that for it with as his on be at by "
+             "compression transform huffman burrows wheeler encoding block").split()
+    out = []
+    length = 0
+    while length < size:
+        word = rng.choice(words)
+        out.append(word)
+        length += len(word) + 1
+    return ' '.join(out)[:size].encode()
+
+
+def measure(decode, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decoded = decode()
+        best = min(best, time.perf_counter() - start)
+    return best, decoded
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    text = sample_text(size)
+    codes = generate_huffman_codes(build_huffman_tree(Counter(text)))
+    payload, bit_length = huffman_encode(text, codes)
+    bits = format(int.from_bytes(payload, 'big'), f'0{len(payload) * 8}b')[:bit_length]
+    megabits = bit_length / 1e6
+
+    print(f"input: {len(text)} symbols, {megabits:.2f} Mbit encoded")
+    results = {}
+    decoders = (
+        ("bit-by-bit", lambda: bitwise_huffman_decode(bits, codes)),
+        ("table", lambda: huffman_decode(payload, codes, bit_length)),
+    )
+    for name, decode in decoders:
+        elapsed, decoded = measure(decode)
+        assert decoded == text, f"{name} decoder mismatch"
+        results[name] = elapsed
+        print(f"{name:>10}: {elapsed:.3f}s  {megabits / elapsed:7.2f} Mbit/s  "
+              f"{len(text) / elapsed / 1e6:6.2f} Msym/s")
+
+    print(f"speedup: {results['bit-by-bit'] / results['table']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Throughput of the vectorized byte Huffman encoder against the BitWriter one.
+
+Run from the repository root:
+
+    python benchmarks/bench_huffman_encode.py [size]
+"""
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_compression_tool import (
+    HUFFMAN_CHUNK_SIZE, BitWriter, canonical_codes, limited_code_lengths, huffman_encode
+)
+
+
+def bitwriter_huffman_encode(data, codes):
+    """The per-symbol encoder: joins code strings and feeds them to a BitWriter."""
+    writer = BitWriter()
+    lookup = codes.__getitem__
+    for start in range(0, len(data), HUFFMAN_CHUNK_SIZE):
+        writer.write_bits(''.join(map(lookup, data[start:start + HUFFMAN_CHUNK_SIZE])))
+    return writer.getvalue(), writer.bit_length
+
+
+def sample_bytes(size, seed=0):
+    """Bytes with a skewed distribution, like MTF/zero-run output."""
+    rng = random.Random(seed)
+    weights = [0.8 ** i for i in range(64)]
+    return bytes(rng.choices(range(64), weights=weights, k=size))
+
+
+def measure(encode, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encoded = encode()
+        best = min(best, time.perf_counter() - start)
+    return best, encoded
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    data = sample_bytes(size)
+    codes = canonical_codes(limited_code_lengths(Counter(data)))
+
+    print(f"input: {len(data)} bytes, {len(codes)} symbols")
+    results = {}
+    expected = None
+    encoders = (
+        ("bitwriter", lambda: bitwriter_huffman_encode(data, codes)),
+        ("vectorized", lambda: huffman_encode(data, codes)),
+    )
+    for name, encode in encoders:
+        elapsed, encoded = measure(encode)
+        expected = expected or encoded
+        assert encoded == expected, f"{name} encoder mismatch"
+        results[name] = elapsed
+        print(f"{name:>10}: {elapsed:.3f}s  {len(data) / elapsed / 1e6:6.2f} MB/s")
+
+    print(f"speedup: {results['bitwriter'] / results['vectorized']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Speedup of compress_file_parallel and decompress_file_parallel over worker counts.
+
+Run from the repository root:
+
+    python benchmarks/bench_parallel.py [size_mb] [block_kb]
+
+Worker counts above os.cpu_count() are skipped since they cannot show a
+speedup on the machine running the benchmark.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_compression_tool import (
+    compress_file_parallel, compress_stream, decompress_file_parallel, decompress_stream
+)
+
+WORKER_COUNTS = (1, 2, 4, 8, 16)
+
+
+def write_sample(path, size, seed=0):
+    """Log-like lines: timestamps, levels and a small vocabulary."""
+    rng = random.Random(seed)
+    levels = ("INFO", "WARN", "ERROR", "DEBUG")
+    words = "request served cache miss hit user id block index worker timeout retry".split()
+    with open(path, 'w') as f:
+        written = 0
+        while written < size:
+            line = (f"2025-02-07 12:{rng.randrange(60):02d}:{rng.randrange(60):02d} "
+                    f"{rng.choice(levels)} {' '.join(rng.choices(words, k=6))} "
+                    f"id={rng.randrange(10000)}\n")
+            f.write(line)
+            written += len(line)
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1_000_000) if len(sys.argv) > 1 else 4_000_000
+    block_size = int(sys.argv[2]) * 1000 if len(sys.argv) > 2 else 250_000
+    cpus = os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "sample.log")
+        dst = os.path.join(tmp, "sample.bwz")
+        write_sample(src, size)
+        size = os.path.getsize(src)
+        print(f"input: {size / 1e6:.1f} MB, block size {block_size // 1000} KB, {cpus} CPUs")
+
+        start = time.perf_counter()
+        with open(src, 'rb') as f_in, open(dst, 'wb') as f_out:
+            compress_stream(f_in, f_out, block_size)
+        serial = time.perf_counter() - start
+        expected = open(dst, 'rb').read()
+        print(f"{'serial':>10}: {serial:7.2f}s  {size / serial / 1e6:6.2f} MB/s")
+
+        for workers in WORKER_COUNTS:
+            if workers > cpus:
+                print(f"{workers:>2} workers: skipped ({cpus} CPUs available)")
+                continue
+            start = time.perf_counter()
+            compress_file_parallel(src, dst, block_size, workers=workers)
+            elapsed = time.perf_counter() - start
+            assert open(dst, 'rb').read() == expected, "parallel output differs"
+            print(f"{workers:>2} workers: {elapsed:7.2f}s  {size / elapsed / 1e6:6.2f} MB/s  "
+                  f"speedup {serial / elapsed:.2f}x")
+
+        restored = os.path.join(tmp, "restored.log")
+        start = time.perf_counter()
+        with open(dst, 'rb') as f_in, open(restored, 'wb') as f_out:
+            decompress_stream(f_in, f_out)
+        serial = time.perf_counter() - start
+        original = open(src, 'rb').read()
+        print(f"decompress serial: {serial:7.2f}s  {size / serial / 1e6:6.2f} MB/s")
+
+        for workers in WORKER_COUNTS:
+            if workers > cpus:
+                continue
+            start = time.perf_counter()
+            decompress_file_parallel(dst, restored, workers=workers)
+            elapsed = time.perf_counter() - start
+            assert open(restored, 'rb').read() == original, "parallel decompression differs"
+            print(f"decompress {workers:>2} workers: {elapsed:7.2f}s  "
+                  f"{size / elapsed / 1e6:6.2f} MB/s  speedup {serial / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Benchmark suite: every stage and the full pipeline across corpora and sizes.
+
+Run from the repository root:
+
+    python benchmarks/suite.py [--sizes 1K,100K,1M] [--corpora english,logs]
+                               [--corpus-dir DIR] [--memory] [--repeat N]
+                               [--output results.json]
+                               [--baseline baseline.json [--tolerance 0.10]]
+
+Each result records wall time, throughput and output size; with --memory
+every case is run once more under tracemalloc to record peak allocation.
+With --baseline, cases whose throughput dropped by more than the tolerance
+are reported and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_compression_tool import (
+    BWT_BLOCK_SIZE, HuffmanCompression,
+    rle_encode, rle_decode,
+    bwt_encode_blocks, bwt_decode_blocks,
+    mtf_encode, mtf_decode, zero_run_encode, zero_run_decode,
+    compress, decompress,
+)
+
+UNITS = {'K': 1_000, 'M': 1_000_000, 'G': 1_000_000_000}
+DEFAULT_SIZES = "1K,10K,100K"
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+# Corpora
+def corpus_random(size, rng):
+    return rng.randbytes(size)
+
+
+def corpus_repetitive(size, rng):
+    unit = rng.randbytes(rng.randint(4, 32))
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+def corpus_english(size, rng):
+    words = ("the of and to in a is that for it as was with be by on not he i this are or his "
+             "from at which but have an they you were her she there been one all we their "
+             "compression algorithm transform block sorting entropy").split()
+    out = bytearray()
+    while len(out) < size:
+        sentence = ' '.join(rng.choices(words, k=rng.randint(5, 15)))
+        out += (sentence[0].upper() + sentence[1:] + '. ').encode()
+    return bytes(out[:size])
+
+
+def corpus_logs(size, rng):
+    levels = ("INFO", "WARN", "ERROR", "DEBUG")
+    paths = ("/api/users", "/api/orders", "/static/app.js", "/health", "/login")
+    out = bytearray()
+    while len(out) < size:
+        out += (f"2025-02-07T{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}Z "
+                f"{rng.choice(levels)} GET {rng.choice(paths)} status={rng.choice((200, 200, 304, 404, 500))} "
+                f"ms={rng.randrange(1, 900)} id={rng.randrange(1 << 20):05x}\n").encode()
+    return bytes(out[:size])
+
+
+def corpus_binary(size, rng):
+    """Fixed-size records of small little-endian integers and flags."""
+    out = bytearray()
+    counter = rng.randrange(1 << 16)
+    while len(out) < size:
+        counter += rng.randint(0, 3)
+        out += counter.to_bytes(4, 'little') + rng.randrange(256).to_bytes(2, 'little') + bytes(2)
+    return bytes(out[:size])
+
+
+CORPORA = {
+    'random': corpus_random,
+    'repetitive': corpus_repetitive,
+    'english': corpus_english,
+    'logs': corpus_logs,
+    'binary': corpus_binary,
+}
+
+
+# Cases: name -> (prepare(data) -> input, run(input) -> output)
+def _bwt_encode(data):
+    return list(bwt_encode_blocks(data))
+
+
+def _bwt_decode(blocks):
+    return b''.join(bwt_decode_blocks(blocks))
+
+
+def _mtf_zrl_encode(data):
+    return zero_run_encode(mtf_encode(data))
+
+
+def _mtf_zrl_decode(symbols):
+    return mtf_decode(zero_run_decode(symbols))
+
+
+def _huffman_encode(data):
+    return HuffmanCompression().encode(data)
+
+
+def _huffman_decode(payload):
+    return HuffmanCompression().decode(payload)
+
+
+def _identity(data):
+    return data
+
+
+CASES = {
+    'rle_encode': (_identity, rle_encode),
+    'rle_decode': (rle_encode, rle_decode),
+    'bwt_encode': (_identity, _bwt_encode),
+    'bwt_decode': (_bwt_encode, _bwt_decode),
+    'mtf_zrl_encode': (_identity, _mtf_zrl_encode),
+    'mtf_zrl_decode': (_mtf_zrl_encode, _mtf_zrl_decode),
+    'huffman_encode': (_identity, _huffman_encode),
+    'huffman_decode': (_huffman_encode, _huffman_decode),
+    'pipeline_compress': (_identity, compress),
+    'pipeline_decompress': (compress, decompress),
+}
+
+
+def output_size(output):
+    if isinstance(output, list):
+        return sum(len(last_column) for last_column, _ in output)
+    return len(output)
+
+
+def run_case(run, prepared, repeat, memory):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = run(prepared)
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        run(prepared)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak, output
+
+
+def load_corpora(names, sizes, corpus_dir, seed):
+    for name in names:
+        for size in sizes:
+            yield name, size, CORPORA[name](size, random.Random(seed))
+    if corpus_dir:
+        for entry in sorted(os.listdir(corpus_dir)):
+            path = os.path.join(corpus_dir, entry)
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                yield f"file:{entry}", len(data), data
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = {(r['corpus'], r['size'], r['case']): r for r in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        reference = baseline.get((result['corpus'], result['size'], result['case']))
+        if reference and result['mb_per_s'] < reference['mb_per_s'] * (1 - tolerance):
+            regressions.append((result, reference))
+    for result, reference in regressions:
+        print(f"REGRESSION {result['case']} on {result['corpus']}/{result['size']}: "
+              f"{result['mb_per_s']:.3f} MB/s vs baseline {reference['mb_per_s']:.3f} MB/s",
+              file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"comma-separated input sizes, e.g. 1K,1M,100M (default {DEFAULT_SIZES})")
+    parser.add_argument("--corpora", default=','.join(CORPORA),
+                        help="comma-separated generated corpora")
+    parser.add_argument("--corpus-dir", help="also benchmark every file in this directory")
+    parser.add_argument("--cases", default=','.join(CASES), help="comma-separated stages to run")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case, best is kept")
+    parser.add_argument("--memory", action="store_true", help="record peak allocation with tracemalloc")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed throughput drop versus the baseline (default 0.10)")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    cases = args.cases.split(',')
+    names = [name for name in args.corpora.split(',') if name]
+
+    results = []
+    for corpus, size, data in load_corpora(names, sizes, args.corpus_dir, args.seed):
+        for case in cases:
+            prepare, run = CASES[case]
+            prepared = prepare(data)
+            seconds, peak, output = run_case(run, prepared, args.repeat, args.memory)
+            if case.endswith('decode') or case.endswith('decompress'):
+                assert output == data, f"{case} round trip mismatch on {corpus}/{size}"
+            result = {
+                'corpus': corpus,
+                'size': size,
+                'case': case,
+                'seconds': seconds,
+                'mb_per_s': size / seconds / 1e6 if seconds else float('inf'),
+                'output_size': output_size(output),
+                'peak_bytes': peak,
+            }
+            results.append(result)
+            peak_text = f"  peak {peak / 1e6:8.2f} MB" if peak is not None else ""
+            print(f"{corpus:>12} {size:>10} {case:<20} {seconds:9.4f}s "
+                  f"{result['mb_per_s']:9.3f} MB/s  out {result['output_size']:>10}{peak_text}")
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'block_size': BWT_BLOCK_SIZE,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Command-line interface to the compression core, without the GUI.
+
+    python -m compression_cli compress [-l LEVEL] [-s STAGES] [-t THREADS] [-o OUT | -c] [FILE]
+    python -m compression_cli decompress [-t THREADS] [-o OUT | -c] [FILE]
+    python -m compression_cli test FILE...
+    python -m compression_cli bench [-l LEVEL] FILE...
+    python -m compression_cli train -o DICT [-s STAGES] [-n TABLES] [--mtf] [--lines] FILE...
+
+FILE defaults to standard input ("-"). Only advanced_compression_tool is
+imported, so PyQt is never loaded and no display is needed.
+"""
+import argparse
+import os
+import sys
+import time
+
+from advanced_compression_tool import (
+    CONTAINER_EXTENSION, DEFAULT_STAGES, STAGE_IDS, ContainerError, ContainerReader,
+    HuffmanDictionary,
+    compress, decompress, compress_file, decompress_file,
+    compress_file_parallel, decompress_file_parallel,
+    compress_stream, decompress_stream,
+)
+
+PROG = "compression_cli"
+
+# Block size per level, as in bzip2: level N uses N * 100 KB blocks
+BLOCK_SIZE_PER_LEVEL = 100_000
+DEFAULT_LEVEL = 9
+
+
+def _is_stdio(path):
+    return path in (None, '-')
+
+
+def _output_path(args, default):
+    if args.stdout or (_is_stdio(args.input) and not args.output):
+        return None
+    return args.output or default
+
+
+def _run(src, dst, threads, stream_fn, file_fn, parallel_fn):
+    """Picks the streaming, mmap or process-pool path for src -> dst."""
+    if _is_stdio(src) or dst is None:
+        src_fp = sys.stdin.buffer if _is_stdio(src) else open(src, 'rb')
+        dst_fp = sys.stdout.buffer if dst is None else open(dst, 'wb')
+        try:
+            stream_fn(src_fp, dst_fp)
+        finally:
+            if src_fp is not sys.stdin.buffer:
+                src_fp.close()
+            if dst_fp is not sys.stdout.buffer:
+                dst_fp.close()
+            else:
+                dst_fp.flush()
+    elif threads > 1:
+        parallel_fn(src, dst, threads)
+    else:
+        file_fn(src, dst)
+
+
+def parse_stages(text):
+    stages = tuple(stage.strip() for stage in text.split(',') if stage.strip())
+    unknown = [stage for stage in stages if stage not in STAGE_IDS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown stage(s) {', '.join(unknown)} (choose from {', '.join(STAGE_IDS)})")
+    return stages
+
+
+def cmd_compress(args):
+    block_size = args.level * BLOCK_SIZE_PER_LEVEL
+    stages = args.stages
+    dst = _output_path(args, None if _is_stdio(args.input) else args.input + CONTAINER_EXTENSION)
+    _run(args.input, dst, args.threads,
+         lambda src, out: compress_stream(src, out, block_size, stages=stages),
+         lambda src, out: compress_file(src, out, block_size, stages=stages),
+         lambda src, out, threads: compress_file_parallel(src, out, block_size, workers=threads,
+                                                          stages=stages))
+
+
+def cmd_decompress(args):
+    default = None
+    if not _is_stdio(args.input):
+        if not args.input.endswith(CONTAINER_EXTENSION) and not (args.output or args.stdout):
+            raise ValueError(f"{args.input}: unknown suffix, use -o or -c")
+        default = args.input[:-len(CONTAINER_EXTENSION)]
+    dst = _output_path(args, default)
+    _run(args.input, dst, args.threads,
+         decompress_stream, decompress_file,
+         lambda src, out, threads: decompress_file_parallel(src, out, workers=threads))
+
+
+def cmd_test(args):
+    failed = False
+    for path in args.inputs:
+        try:
+            with open(path, 'rb') as f:
+                reader = ContainerReader(f)
+                total = sum(len(data) for data in reader)
+            print(f"{path}: ok ({len(reader)} blocks, {total} bytes)")
+        except (OSError, ContainerError) as e:
+            print(f"{path}: FAILED ({e})", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+def cmd_bench(args):
+    block_size = args.level * BLOCK_SIZE_PER_LEVEL
+    for path in args.inputs:
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = time.perf_counter()
+        packed = compress(data, block_size)
+        middle = time.perf_counter()
+        restored = decompress(packed)
+        end = time.perf_counter()
+        if restored != data:
+            print(f"{path}: round trip mismatch", file=sys.stderr)
+            return 1
+        size = max(len(data), 1)
+        print(f"{path}: {len(data)} -> {len(packed)} bytes "
+              f"({len(packed) / size * 100:.1f}%, {len(packed) * 8 / size:.3f} bits/byte), "
+              f"compress {len(data) / (middle - start) / 1e6:.2f} MB/s, "
+              f"decompress {len(data) / (end - middle) / 1e6:.2f} MB/s")
+    return 0
+
+
+def read_samples(paths, lines):
+    """Yields each file, or each line of each file with `lines`, as one sample."""
+    for path in paths:
+        with open(path, 'rb') as f:
+            if lines:
+                yield from f
+            else:
+                yield f.read()
+
+
+def cmd_train(args):
+    samples = list(read_samples(args.inputs, args.lines))
+    dictionary = HuffmanDictionary.train(samples, tables=args.tables, stages=args.stages,
+                                         mtf=args.mtf, dict_id=args.dict_id)
+    dictionary.save(args.output)
+    print(f"{args.output}: dictionary {dictionary.dict_id:#010x}, {len(dictionary)} table(s)"
+          f"{', MTF alphabet' if dictionary.mtf_alphabet else ''}, "
+          f"trained on {len(samples)} samples ({sum(map(len, samples))} bytes)")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog=PROG, description="BWT + MTF + Huffman block compressor")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_io(sub):
+        sub.add_argument("input", nargs="?", default="-", help="input file, '-' for stdin")
+        group = sub.add_mutually_exclusive_group()
+        group.add_argument("-o", "--output", help="output file")
+        group.add_argument("-c", "--stdout", action="store_true", help="write to standard output")
+        sub.add_argument("-t", "--threads", type=int, default=1,
+                         help="worker processes (files only, default 1)")
+
+    def add_level(sub):
+        sub.add_argument("-l", "--level", type=int, choices=range(1, 10), default=DEFAULT_LEVEL,
+                         metavar="1-9", help="block size in 100 KB units (default 9)")
+
+    sub = subparsers.add_parser("compress", help="compress a file or stdin")
+    add_io(sub)
+    add_level(sub)
+    sub.add_argument("-s", "--stages", type=parse_stages, default=DEFAULT_STAGES,
+                     help=f"comma-separated pipeline stages (default {','.join(DEFAULT_STAGES)})")
+    sub.set_defaults(func=cmd_compress)
+
+    sub = subparsers.add_parser("decompress", help="decompress a file or stdin")
+    add_io(sub)
+    sub.set_defaults(func=cmd_decompress)
+
+    sub = subparsers.add_parser("test", help="check the integrity of compressed files")
+    sub.add_argument("inputs", nargs="+")
+    sub.set_defaults(func=cmd_test)
+
+    sub = subparsers.add_parser("bench", help="measure ratio and throughput on files")
+    sub.add_argument("inputs", nargs="+")
+    add_level(sub)
+    sub.set_defaults(func=cmd_bench)
+
+    sub = subparsers.add_parser("train", help="train a static Huffman dictionary on sample records")
+    sub.add_argument("inputs", nargs="+", help="sample files")
+    sub.add_argument("-o", "--output", required=True, help="dictionary file to write")
+    sub.add_argument("-s", "--stages", type=parse_stages, default=('huffman',),
+                     help="stages the records are coded with, ending in huffman (default huffman)")
+    sub.add_argument("-n", "--tables", type=int, default=1, help="Huffman tables to train (default 1)")
+    sub.add_argument("--mtf", action="store_true", help="also train the initial MTF alphabet")
+    sub.add_argument("--lines", action="store_true", help="treat every line as one sample")
+    sub.add_argument("--dict-id", type=lambda text: int(text, 0),
+                     help="dictionary id (default: derived from the tables)")
+    sub.set_defaults(func=cmd_train)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "threads", 1) < 1:
+        args.threads = os.cpu_count() or 1
+    try:
+        return args.func(args) or 0
+    except (OSError, ValueError) as e:
+        print(f"{PROG}: error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
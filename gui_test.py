@@ -1,27 +1,66 @@
 import json
-import re
 import sys
 import os
 from datetime import datetime, timedelta
 from collections import Counter
 import pickle
-from PyQt6.QtCore import Qt, QTimer, QEvent
+from PyQt6.QtCore import Qt, QTimer, QEvent, QThread, pyqtSignal
 from PyQt6.QtGui import QFont, QPen, QBrush, QColor, QPainter
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QDialog, QVBoxLayout, QGraphicsView,
     QGraphicsScene, QGraphicsEllipseItem, QGraphicsTextItem,
-    QFileDialog, QMessageBox, QMenu, QPushButton, QHBoxLayout, QInputDialog, QFrame, QLabel, QComboBox,
+    QFileDialog, QMessageBox, QMenu, QPushButton, QHBoxLayout, QFrame, QLabel, QComboBox,
     QGraphicsRectItem, QTextEdit, QTabWidget, QSizePolicy, QScrollArea, QGraphicsProxyWidget, QWidget, QGridLayout,
-    QGroupBox, QSlider, QCheckBox, QSpinBox
+    QGroupBox, QSlider, QCheckBox, QSpinBox, QProgressDialog
 )
 from PyQt6 import uic
 from advanced_compression_tool import (
     bwt_encode, bwt_decode,
     rle_encode, rle_decode,
     build_huffman_tree, generate_huffman_codes,
-    huffman_encode, huffman_decode, create_rotations
+    HuffmanCompression, create_rotations,
+    compress, decompress, compress_file_parallel, decompress_file_parallel,
+    CONTAINER_MAGIC, CONTAINER_EXTENSION, StageProfile, Pipeline,
+    BWT_END, BWT_TRACE_LIMIT, encode_varint, decode_varint
 )
 
+# Files larger than this are offered file-to-file processing instead of loading
+LARGE_FILE_SIZE = 10_000_000
+
+# Core pipeline stages behind the combined "BWT and RLE and Huffman" method
+COMBINED_STAGES = ('bwt', 'mtf', 'rle', 'huffman')
+STAGE_TITLES = {'bwt': "BWT", 'mtf': "MTF", 'rle': "RLE", 'huffman': "Huffman"}
+
+# Record each stage's peak allocation with tracemalloc (slows processing down)
+TRACE_STAGE_MEMORY = False
+
+
+def format_stage_timings(stages):
+    """One line per stage from the 'stages' entry of a history item."""
+    lines = []
+    for stage in stages or []:
+        line = (f"{stage['name']}: {stage['wall_seconds'] * 1000:.2f} ms "
+                f"(CPU {stage['cpu_seconds'] * 1000:.2f} ms), "
+                f"{stage['bytes_in']} -> {stage['bytes_out']} bytes")
+        if stage.get('peak_bytes') is not None:
+            line += f", peak {stage['peak_bytes']} bytes"
+        lines.append(line)
+    return lines
+
+
+def symbol_label(symbol):
+    """Printable form of a byte value, "$" for the BWT end marker."""
+    if symbol == BWT_END:
+        return "$"
+    if 32 <= symbol < 127:
+        return chr(symbol)
+    return f"\\x{symbol:02x}"
+
+
+def format_symbols(symbols):
+    """Printable form of a sequence of byte values, such as a BWT row."""
+    return ''.join(symbol_label(symbol) for symbol in symbols)
+
 
 class CompressionHistoryDialog(QDialog):
     def __init__(self, parent=None, compression_history=None):
@@ -274,6 +313,20 @@ class CompressionHistoryDialog(QDialog):
             self.scene.addItem(operation_info)
             current_y += 30  # Move to next line inside the card
 
+            # Per-stage timings, when the item recorded them
+            stage_lines = format_stage_timings(history_item.get("stages"))
+            if stage_lines:
+                stage_info = QGraphicsTextItem()
+                stage_info.setHtml(
+                    f'<div style="color: #FFD700; font-size: 12px;">'
+                    f'<b>Stages:</b><br>{"<br>".join(stage_lines)}'
+                    f'</div>'
+                )
+                stage_info.setPos(padding, current_y)
+                stage_info.setTextWidth(view_width - padding * 2)
+                self.scene.addItem(stage_info)
+                current_y += stage_info.boundingRect().height()
+
             # Size information (Middle row)
             size_info = QGraphicsTextItem()
             size_info.setHtml(
@@ -524,7 +577,7 @@ class CompressionHistoryDialog(QDialog):
         fieldnames = [
             'date', 'algorithm', 'operation_type', 'original_text',
             'processed_text', 'original_size', 'compressed_size',
-            'compression_ratio', 'time_taken'
+            'compression_ratio', 'time_taken', 'stages'
         ]
 
         with open(filename, 'w', newline='', encoding='utf-8') as f:
@@ -532,6 +585,7 @@ class CompressionHistoryDialog(QDialog):
             writer.writeheader()
             for item in self.compression_history:
                 row = {field: item.get(field, '') for field in fieldnames}
+                row['stages'] = '; '.join(format_stage_timings(item.get('stages')))
                 writer.writerow(row)
 
     def export_to_json(self, filename):
@@ -863,6 +917,43 @@ class VisualizerWindow(QDialog):
         )
 
 
+class FileJobCancelled(Exception):
+    """Raised from a FileJob's progress callback to stop the job."""
+
+
+class FileJob(QThread):
+    """Runs a file-to-file compression or decompression off the GUI thread.
+
+    `function` is compress_file_parallel or decompress_file_parallel, so
+    the blocks are processed in worker processes. `progress` carries the
+    percentage done after each block. Setting `cancelled` stops the job
+    after the blocks in progress and discards the partial output; `error`
+    holds the message of any other failure once the thread has finished.
+    """
+    progress = pyqtSignal(int)
+
+    def __init__(self, function, src_path, dst_path, parent=None):
+        super().__init__(parent)
+        self.function = function
+        self.src_path = src_path
+        self.dst_path = dst_path
+        self.cancelled = False
+        self.error = None
+
+    def _report(self, done, total):
+        if self.cancelled:
+            raise FileJobCancelled
+        self.progress.emit(done * 100 // max(total, 1))
+
+    def run(self):
+        try:
+            self.function(self.src_path, self.dst_path, progress=self._report)
+        except FileJobCancelled:
+            pass
+        except Exception as e:
+            self.error = str(e)
+
+
 class MyApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -955,6 +1046,7 @@ class MyApp(QMainWindow):
         self.current_huffman_tree = None
         self.compression_history = []
         self.codes = None
+        self.profile = StageProfile()
 
     def update_info_labels(self):
         """Update datetime and user information labels"""
@@ -1010,6 +1102,7 @@ class MyApp(QMainWindow):
     def process_text(self, text, algorithm, operation):
         """Process text using selected algorithm"""
         start_time = datetime.now()
+        self.profile = StageProfile(trace_memory=TRACE_STAGE_MEMORY)
         algorithm_functions = {
             "BWT": self.BWT,
             "RLE": self.RLE,
@@ -1017,35 +1110,74 @@ class MyApp(QMainWindow):
         }
         self.codes = None
         if algorithm == 'BWT and RLE and Huffman':
-            if "Encode" in operation:
-                for algo in ["BWT", "RLE", "Huffman"]:
-                    text = algorithm_functions[algo](text, "Encode")
-            if "Decode" in operation:
-                for algo in reversed(["BWT", "RLE", "Huffman"]):
-                    text = algorithm_functions[algo](text, "Decode")
+            text = self.run_pipeline(text, operation)
         else:
             text = algorithm_functions[algorithm](text, operation)
 
+        # Binary stage output is measured in bytes and displayed as hex
+        compressed_size = None
+        if isinstance(text, bytes):
+            compressed_size = len(text)
+            text = text.hex()
+
         self.save_compression_result(
             self.input.toPlainText(), text, algorithm, operation,
-            (datetime.now() - start_time).total_seconds()
+            (datetime.now() - start_time).total_seconds(),
+            compressed_size=compressed_size,
+            stages=self.profile.as_dicts()
         )
         return text
 
+    def run_pipeline(self, text, operation):
+        """Run the combined method through the core Pipeline, drawing each stage"""
+        pipeline = Pipeline(COMBINED_STAGES, profile=self.profile,
+                            observers=[self.draw_pipeline_step])
+        if "Encode" in operation:
+            text = pipeline.encode(text.encode('utf-8'))
+        if "Decode" in operation:
+            data = bytes.fromhex(text) if isinstance(text, str) else text
+            text = pipeline.decode(data).decode('utf-8')
+        return text
+
+    def draw_pipeline_step(self, stage, operation, data_in, data_out):
+        """Pipeline observer: show one stage's result in the scene"""
+        title = f"{STAGE_TITLES.get(stage.name, stage.name)} {operation.capitalize()}"
+        self.add_text_to_scene(f"{title} Steps:", x=0, y=self.y_offset, is_title=True)
+        self.add_text_to_scene(
+            f"{title} Result ({len(data_in)} -> {len(data_out)} bytes): {data_out.hex()}",
+            x=0, y=self.y_offset)
+        if stage.name == 'huffman' and operation == 'encode':
+            self.current_huffman_tree = stage.coder.huffman_tree
+            self.codes = stage.coder.huffman_codes
+            self.show_huffman_tree_button.setEnabled(True)
+
     def BWT(self, text, operation):
         """Handle BWT compression"""
         try:
             if "Encode" in operation:
-                encoded, rotations = bwt_encode(text)
+                data = text.encode('utf-8') if isinstance(text, str) else text
+                last_column, primary_index = self.profile.run("BWT Encode", bwt_encode, data)
                 self.add_text_to_scene("BWT Encoding Steps:", x=0, y=self.y_offset, is_title=True)
                 self.add_text_to_scene("Show Rotations in : Visualize Huffman ", x=0, y=self.y_offset)
-                self.add_text_to_scene(f"BWT Encoded Result: {encoded}", x=0, y=self.y_offset)
+                self.add_text_to_scene(f"BWT Encoded Result: {format_symbols(last_column)}",
+                                       x=0, y=self.y_offset)
+                self.add_text_to_scene(f"Primary Index: {primary_index}", x=0, y=self.y_offset)
+                # Output: primary index as a varint, then the last column
+                encoded = encode_varint(primary_index) + last_column
                 text = encoded
             if 'Decode' in operation:
-                decoded, iterations = bwt_decode(text)
+                data = bytes.fromhex(text) if isinstance(text, str) else text
+                primary_index, offset = decode_varint(data)
+                decoded, iterations = self.profile.run("BWT Decode", bwt_decode, data[offset:],
+                                                       primary_index, trace=True)
                 self.add_text_to_scene("BWT Decoding Steps:", x=0, y=self.y_offset, is_title=True)
+                if not iterations and len(data) > offset:
+                    self.add_text_to_scene(f"Steps are only shown for up to {BWT_TRACE_LIMIT} bytes",
+                                           x=0, y=self.y_offset)
                 for i, iteration in enumerate(iterations):
-                    self.add_text_to_scene(f"Iteration {i + 1}: {iteration}", x=0, y=self.y_offset)
+                    rows = [format_symbols(row) for row in iteration]
+                    self.add_text_to_scene(f"Iteration {i + 1}: {rows}", x=0, y=self.y_offset)
+                decoded = decoded.decode('utf-8')
                 self.add_text_to_scene(f"BWT Decoded Result: {decoded}", x=0, y=self.y_offset)
 
             if 'Encode' in operation:
@@ -1059,12 +1191,16 @@ class MyApp(QMainWindow):
         """Handle RLE compression"""
         try:
             if "Encode" in operation:
-                encoded = rle_encode(text)
+                data = text.encode('utf-8') if isinstance(text, str) else text
+                encoded = self.profile.run("RLE Encode", rle_encode, data)
                 self.add_text_to_scene("RLE Encoding Steps:", x=0, y=self.y_offset, is_title=True)
-                self.add_text_to_scene(f"RLE Encoded Result: {encoded}", x=0, y=self.y_offset)
+                self.add_text_to_scene(
+                    f"RLE Encoded Result ({len(data)} -> {len(encoded)} bytes): {encoded.hex()}",
+                    x=0, y=self.y_offset)
                 text = encoded
             if 'Decode' in operation:
-                decoded = rle_decode(text)
+                data = bytes.fromhex(text) if isinstance(text, str) else text
+                decoded = self.profile.run("RLE Decode", rle_decode, data).decode('utf-8')
                 self.add_text_to_scene("RLE Decoding Steps:", x=0, y=self.y_offset, is_title=True)
                 self.add_text_to_scene(f"RLE Decoded Result: {decoded}", x=0, y=self.y_offset)
 
@@ -1079,24 +1215,29 @@ class MyApp(QMainWindow):
         """Handle Huffman compression"""
         try:
             if "Encode" in operation:
-                freq_dict = Counter(text)
-                self.current_huffman_tree = build_huffman_tree(freq_dict)
-                self.codes = generate_huffman_codes(self.current_huffman_tree)
-                encoded = huffman_encode(text, self.codes)
-
+                data = text.encode('utf-8') if isinstance(text, str) else text
+                freq_dict = Counter(data)
+                huffman = HuffmanCompression()
+                encoded = self.profile.run("Huffman Encode", huffman.encode, data)
+                self.current_huffman_tree = huffman.huffman_tree
+                self.codes = huffman.huffman_codes
+
+                frequencies = {symbol_label(symbol): count for symbol, count in freq_dict.most_common()}
+                codes = {symbol_label(symbol): code for symbol, code in self.codes.items()}
                 self.add_text_to_scene("Huffman Encoding Steps:", x=0, y=self.y_offset, is_title=True)
-                self.add_text_to_scene(f"Frequency Table: {freq_dict}", x=0, y=self.y_offset)
-                self.add_text_to_scene(f"Huffman Codes: {self.codes}", x=0, y=self.y_offset)
-                self.add_text_to_scene(f"Huffman Encoded Result: {encoded}", x=0, y=self.y_offset)
+                self.add_text_to_scene(f"Frequency Table: {frequencies}", x=0, y=self.y_offset)
+                self.add_text_to_scene(f"Canonical Huffman Codes: {codes}", x=0, y=self.y_offset)
+                self.add_text_to_scene(
+                    f"Huffman Encoded Result (code-length header + {huffman.bit_length} bits, "
+                    f"{len(encoded)} bytes): {encoded.hex()}", x=0, y=self.y_offset)
 
                 self.show_huffman_tree_button.setEnabled(True)
                 text = encoded
             if 'Decode' in operation:
-                if not self.codes:
-                    self.codes = self.show_input_dialog()
-                    # raise ValueError("No Huffman codes available for decoding")
-
-                decoded = huffman_decode(text, self.codes)
+                # The payload carries its own code-length header
+                payload = bytes.fromhex(text) if isinstance(text, str) else text
+                decoded = self.profile.run("Huffman Decode", HuffmanCompression().decode, payload)
+                decoded = decoded.decode('utf-8')
                 self.add_text_to_scene("Huffman Decoding Steps:", x=0, y=self.y_offset, is_title=True)
                 self.add_text_to_scene(f"Huffman Decoded Result: {decoded}", x=0, y=self.y_offset)
 
@@ -1162,7 +1303,12 @@ class MyApp(QMainWindow):
         self.huffman_scene.addItem(ellipse)
 
         # Add text
-        text = f"{node.char}:{node.freq}" if node.char else f"{node.freq}"
+        if node.char is None:
+            text = f"{node.freq}"
+        elif isinstance(node.char, int):
+            text = f"{symbol_label(node.char)}:{node.freq}"
+        else:
+            text = f"{node.char}:{node.freq}"
         text_item = QGraphicsTextItem(text)
         font = text_item.font()
         font.setPointSize(int(self.radius * 0.5))
@@ -1311,12 +1457,13 @@ class MyApp(QMainWindow):
             f"Input: {text}"
         )
 
-        # Step 2: Create Rotations
-        rotations = create_rotations(text)
+        # Step 2: Create Rotations of the UTF-8 bytes ("$" marks the end)
+        data = text.encode('utf-8')
+        rotations = create_rotations(data)
         for i, rotation in enumerate(rotations):
             visualizer.add_visualization_step(
                 f"Step 2.{i + 1}: Rotation {i + 1}",
-                f"Rotation {i + 1}:\n{rotation}"
+                f"Rotation {i + 1}:\n{format_symbols(rotation)}"
             )
 
         # Step 3: Sort Rotations
@@ -1324,16 +1471,19 @@ class MyApp(QMainWindow):
         for i, rotation in enumerate(sorted_rotations):
             visualizer.add_visualization_step(
                 f"Step 3.{i + 1}: Sorted Rotation {i + 1}",
-                f"Sorted Rotation {i + 1}:\n{rotation}"
+                f"Sorted Rotation {i + 1}:\n{format_symbols(rotation)}"
             )
 
-        # Step 4: Final Result
-        encoded = ''.join(rotation[-1] for rotation in sorted_rotations)
+        # Step 4: Final Result: the end marker's row becomes the primary index
+        last_column = [rotation[-1] for rotation in sorted_rotations]
+        primary_index = last_column.index(BWT_END)
+        encoded = bytes(symbol for symbol in last_column if symbol != BWT_END)
         visualizer.add_visualization_step(
             "Step 4: Final BWT Result",
             f"Original Text: {text}\n"
-            f"Encoded Text: {encoded}\n"
-            f"Compression Ratio: {(len(encoded) / len(text)) * 100:.2f}%"
+            f"Encoded Text: {format_symbols(encoded)}\n"
+            f"Primary Index: {primary_index}\n"
+            f"Compression Ratio: {(len(encoded) / len(data)) * 100:.2f}%"
         )
 
         visualizer.exec()
@@ -1415,49 +1565,56 @@ class MyApp(QMainWindow):
         )
 
         # Step 2: Process Characters
-        encoded = ""
+        runs = []
         i = 0
         while i < len(text):
             count = 1
             while i + 1 < len(text) and text[i] == text[i + 1]:
                 count += 1
                 i += 1
-            current_encoded = f"{text[i]}{count}"
-            encoded += current_encoded
+            runs.append(f"'{text[i]}'" + (f" x{count}" if count > 1 else ""))
             visualizer.add_visualization_step(
                 f"Step 2: Processing Character '{text[i]}'",
                 f"Current Character: '{text[i]}'\n"
                 f"Count: {count}\n"
-                f"Current Encoding: {encoded}\n"
+                f"Runs So Far: {', '.join(runs)}\n"
                 f"Remaining Text: {text[i + 1:] if i + 1 < len(text) else '(end)'}"
             )
             i += 1
 
         # Step 3: Final Result
+        data = text.encode('utf-8')
+        encoded = rle_encode(data)
         visualizer.add_visualization_step(
             "Step 3: Final RLE Result",
             f"Original Text: {text}\n"
-            f"Encoded Text: {encoded}\n"
-            f"Original Size: {len(text)} characters\n"
-            f"Encoded Size: {len(encoded)} characters\n"
-            f"Compression Ratio: {(len(encoded) / len(text)) * 100:.2f}%"
+            f"Encoded Bytes: {encoded.hex()}\n"
+            f"(run count, run bytes, repeat bitmap, extra run lengths)\n"
+            f"Original Size: {len(data)} bytes\n"
+            f"Encoded Size: {len(encoded)} bytes\n"
+            f"Compression Ratio: {(len(encoded) / len(data)) * 100:.2f}%"
         )
 
         visualizer.exec()
 
-    def save_compression_result(self, original, compressed, method, operation, time_taken):
+    def save_compression_result(self, original, compressed, method, operation, time_taken,
+                                compressed_size=None, stages=None):
         """Save compression results with input and output text"""
+        original_size = len(original.encode('utf-8'))
+        if compressed_size is None:
+            compressed_size = len(compressed.encode('utf-8'))
         result = {
             'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'algorithm': method,  # This key needs to match
             'operation_type': operation,  # Changed from 'operation' to 'operation_type'
             'original_text': original,
             'processed_text': compressed,
-            'original_size': len(original),
-            'compressed_size': len(compressed),
-            'compression_ratio': ((len(original) - len(compressed)) / len(original) * 100)
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'compression_ratio': ((original_size - compressed_size) / original_size * 100)
             if operation == "Encode" else 0,
-            'time_taken': time_taken
+            'time_taken': time_taken,
+            'stages': stages or []
         }
         self.compression_history.append(result)
         self.save_compression_history()
@@ -1486,25 +1643,101 @@ class MyApp(QMainWindow):
         try:
             filename, _ = QFileDialog.getOpenFileName(
                 self, "Open File", "",
-                "Text Files (*.txt);;All Files (*.*)"
+                f"Text Files (*.txt);;Compressed Files (*{CONTAINER_EXTENSION});;All Files (*.*)"
             )
             if filename:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    self.input.setPlainText(f.read())
+                if os.path.getsize(filename) > LARGE_FILE_SIZE and self.process_large_file(filename):
+                    return
+                with open(filename, 'rb') as f:
+                    data = f.read()
+                if data.startswith(CONTAINER_MAGIC):
+                    data = decompress(data)
+                self.input.setPlainText(data.decode('utf-8'))
                 self.statusbar.showMessage(f"File loaded: {filename}", 3000)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to open file: {str(e)}")
 
+    def process_large_file(self, filename):
+        """Offer to compress or decompress a large file file-to-file.
+
+        The file is memory-mapped by the core instead of being loaded into
+        the editor. Returns False if the user prefers to load it anyway.
+        """
+        with open(filename, 'rb') as f:
+            is_container = f.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+        action = "Decompress" if is_container else "Compress"
+        size_mb = os.path.getsize(filename) / 1e6
+        reply = QMessageBox.question(
+            self, "Large File",
+            f"This file is {size_mb:.1f} MB. {action} it directly to another file "
+            f"instead of loading it into the editor?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.Yes
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return False
+
+        if is_container and filename.endswith(CONTAINER_EXTENSION):
+            default = filename[:-len(CONTAINER_EXTENSION)]
+        elif is_container:
+            default = filename + ".out"
+        else:
+            default = filename + CONTAINER_EXTENSION
+        target, _ = QFileDialog.getSaveFileName(self, f"{action} To", default, "All Files (*.*)")
+        if target:
+            function = decompress_file_parallel if is_container else compress_file_parallel
+            self.start_file_job(FileJob(function, filename, target, self), action)
+        return True
+
+    def start_file_job(self, job, action):
+        """Run a FileJob with a progress dialog whose Cancel button stops it."""
+        dialog = QProgressDialog(f"{action}ing {os.path.basename(job.src_path)}...", "Cancel",
+                                 0, 100, self)
+        dialog.setWindowTitle(f"{action} File")
+        dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        dialog.setMinimumDuration(0)
+        dialog.setValue(0)
+        start_time = datetime.now()
+
+        def cancel():
+            job.cancelled = True
+            job.progress.disconnect(dialog.setValue)
+            self.statusbar.showMessage(f"Cancelling {action.lower()}: finishing the blocks in progress...")
+
+        def finished():
+            dialog.reset()
+            if job.error is not None:
+                QMessageBox.critical(self, "Error", f"{action} failed: {job.error}")
+            elif job.cancelled:
+                self.statusbar.showMessage(f"{action} of {job.src_path} cancelled", 5000)
+            else:
+                self.statusbar.showMessage(
+                    f"{action}ed {job.src_path} -> {job.dst_path} in "
+                    f"{(datetime.now() - start_time).total_seconds():.1f}s", 5000)
+            self.file_job = None
+
+        job.progress.connect(dialog.setValue)
+        dialog.canceled.connect(cancel)
+        job.finished.connect(finished)
+        # Keep a reference so the thread outlives this call
+        self.file_job = job
+        job.start()
+
     def save_output(self):
-        """Save output to file"""
+        """Save output to file, or the compressed input as a container"""
         try:
-            filename, _ = QFileDialog.getSaveFileName(
+            container_filter = f"Compressed Files (*{CONTAINER_EXTENSION})"
+            filename, selected_filter = QFileDialog.getSaveFileName(
                 self, "Save Output", "",
-                "Text Files (*.txt);;All Files (*.*)"
+                f"Text Files (*.txt);;{container_filter};;All Files (*.*)"
             )
             if filename:
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(self.output.toPlainText())
+                if selected_filter == container_filter or filename.endswith(CONTAINER_EXTENSION):
+                    with open(filename, 'wb') as f:
+                        f.write(compress(self.input.toPlainText().encode('utf-8')))
+                else:
+                    with open(filename, 'w', encoding='utf-8') as f:
+                        f.write(self.output.toPlainText())
                 self.statusbar.showMessage(f"Output saved to: {filename}", 3000)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save file: {str(e)}")
@@ -1583,32 +1816,6 @@ class MyApp(QMainWindow):
         else:
             event.ignore()
 
-    def show_input_dialog(self):
-        """Displays an input dialog for the Huffman code table and validates the input."""
-        question = "Please enter your Huffman code table in the format:\n{'A': '0', 'B': '10', 'N': '11'}"
-
-        while True:
-            # Show the input dialog
-            text, ok = QInputDialog.getText(self, 'Input Huffman Code Table', question)
-
-            # Check if the user clicked OK and provided input
-            if ok:
-                if text.strip():  # Validate that input is not empty
-                    try:
-                        # Attempt to parse the input as a dictionary
-                        code_table = eval(re.search(r'({.*?})', text).group(1))
-                        if isinstance(code_table, dict):  # Ensure it's a dictionary
-                            return code_table
-                        else:
-                            raise ValueError("Input is not a valid dictionary.")
-                    except Exception as e:
-                        QMessageBox.critical(self, "Invalid Input", str(e))
-                else:
-                    QMessageBox.critical(self, "Input Error", "The input cannot be empty. Please try again.")
-            else:
-                # User pressed cancel or closed the dialog
-                raise ValueError("User cancelled the input.")
-
     def show_compression_history(self):
         """Show compression history dialog"""
         try: